@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from dataclasses import dataclass
+import kernels
 
 @dataclass
 class Position:
@@ -10,118 +11,202 @@ class Position:
     sl: float
     tp: float
 
-def run_backtest(df, stop_loss=0.02, take_profit=0.04, n_shares=1,
-                 com=0.125/100, borrow_rate=0.25/100,
-                 price_col="close", initial_cash=1_000_000):
-
-    df = df.copy()
-
-    cash = float(initial_cash)
-    active_long = []
-    active_short = []
-    portfolio_values = []
-    trade_pnls = []
-
-    FEE_LONG = com
-    FEE_SHORT = com + borrow_rate
-
+@dataclass
+class Order:
+    side: str         # "buy" / "sell"
+    n_shares: float
+    price: float
+    reason: str       # "open_long", "close_long", "open_short", "close_short"
+    bar: int
+
+
+# Un registro por trade cerrado (cierres forzados al final con forced=True)
+TRADE_DTYPE = np.dtype([
+    ("bar", np.int32),        # barra de salida
+    ("entry_bar", np.int32),
+    ("side", np.int8),        # 1=long, -1=short
+    ("n_shares", np.float64),
+    ("entry", np.float64),
+    ("exit", np.float64),
+    ("pnl", np.float64),
+    ("forced", np.bool_),
+])
+
+
+def trades_from_fills(fills) -> np.ndarray:
+    """Convierte el log de fills de `kernels.backtest_loop` en un array TRADE_DTYPE."""
+    fills = np.asarray(fills, dtype=float).reshape(-1, len(kernels.FILL_COLUMNS))
+    col = {name: fills[:, i] for i, name in enumerate(kernels.FILL_COLUMNS)}
+    trades = np.empty(len(fills), dtype=TRADE_DTYPE)
+    trades["bar"] = col["exit_bar"]
+    trades["entry_bar"] = col["entry_bar"]
+    trades["side"] = col["side"]
+    trades["n_shares"] = col["n_shares"]
+    trades["entry"] = col["entry_price"]
+    trades["exit"] = col["exit_price"]
+    trades["pnl"] = col["pnl"]
+    trades["forced"] = col["forced"] != 0
+    return trades
 
-    for i, row in df.iterrows():
-        price = float(row[price_col])
-        signal = int(row["signal"])  # 1=buy, 0=hold, -1=sell
 
-        pnl_this_step = 0
-        closed_any = False
+@dataclass
+class BacktestResult:
+    """Salida compacta de `run_backtest(output="compact")`."""
+    equity: np.ndarray        # float64, un valor cada `stride` barras (+ la última)
+    trades: np.ndarray        # TRADE_DTYPE
+    final_cash: float
+    n_bars: int
+    stride: int = 1
+
+    @property
+    def bars(self) -> np.ndarray:
+        """Barra de cada valor de `equity`."""
+        return kernels.checkpoint_bars(self.n_bars, self.stride)
+
+    @property
+    def closed_trades(self) -> np.ndarray:
+        """Trades cerrados por SL/TP (sin los cierres forzados del final)."""
+        return self.trades[~self.trades["forced"]]
+
+    @property
+    def n_trades(self) -> int:
+        return int((~self.trades["forced"]).sum())
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        DataFrame con 'portfolio_value' en las barras guardadas (índice = barra).
+        Con stride > 1, pasar `stride=self.stride` a `calculate_all_metrics`.
+        """
+        return pd.DataFrame({"portfolio_value": self.equity}, index=self.bars)
+
+
+class PositionBook:
+    """
+    Versión incremental del loop de `run_backtest` (mismas reglas de SL/TP,
+    tamaño y comisiones), una barra a la vez. `step` actualiza el estado
+    suponiendo ejecución al precio de la barra y devuelve las órdenes que
+    deben enviarse (ver `live.OrderSink`).
+    """
+
+    def __init__(self, stop_loss=0.02, take_profit=0.04,
+                 com=0.125/100, borrow_rate=0.25/100, initial_cash=1_000_000):
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.fee_long = com
+        self.fee_short = com + borrow_rate
+        self.cash = float(initial_cash)
+        self.active_long = []
+        self.active_short = []
+        self.bar = 0
+
+    def step(self, price: float, signal: int) -> list:
+        price = float(price)
+        orders = []
 
         # ---- CLOSE LONGS ----
-        for pos in active_long.copy():
-            pnl_realized = 0
+        for pos in self.active_long.copy():
             if price >= pos.tp or price <= pos.sl:
-                # Realize PnL
-                entry_fee = pos.entry_price * pos.n_shares * FEE_LONG
-                exit_fee  = price * pos.n_shares * FEE_LONG
-                pnl_realized = (price - pos.entry_price) * pos.n_shares - entry_fee - exit_fee
-
-                # Flujo de caja al cerrar long: cobras venta neta de comisión
-                cash += price * pos.n_shares * (1 - FEE_LONG)
-                active_long.remove(pos)
-
-                pnl_this_step += pnl_realized
-                closed_any = True
+                self.cash += price * pos.n_shares * (1 - self.fee_long)
+                self.active_long.remove(pos)
+                orders.append(Order("sell", pos.n_shares, price, "close_long", self.bar))
 
         # ---- CLOSE SHORTS ----
-        for pos in active_short.copy():
-            pnl_realized = 0
+        for pos in self.active_short.copy():
             if price <= pos.tp or price >= pos.sl:
-                # PnL for short: (entry_price - exit_price) * n_shares
                 pnl_gross = (pos.entry_price - price) * pos.n_shares
-                # Fees de entrada y salida (simplificado)
-                entry_fee = pos.entry_price * pos.n_shares * FEE_SHORT
-                exit_fee  = price * pos.n_shares * FEE_SHORT
-                pnl_realized = pnl_gross - entry_fee - exit_fee
-                
-                cash += (pnl_gross * (1 - FEE_SHORT)) + (pos.entry_price * pos.n_shares)
-
-                active_short.remove(pos)
-                pnl_this_step += pnl_realized
-                closed_any = True
+                self.cash += (pnl_gross * (1 - self.fee_short)) + (pos.entry_price * pos.n_shares)
+                self.active_short.remove(pos)
+                orders.append(Order("buy", pos.n_shares, price, "close_short", self.bar))
 
         # ---- OPEN LONG ----
-        if signal == 1 and len(active_short) == 0:
-            n_shares_dynamic = max(1, (cash * 0.02) / price)
-            cost = price * n_shares_dynamic * (1 + FEE_LONG)
-            if cash > cost:
-                cash -= cost
-                pos = Position("long", n_shares_dynamic, price,
-                               price * (1 - stop_loss),
-                               price * (1 + take_profit))
-                active_long.append(pos)
+        if signal == 1 and len(self.active_short) == 0:
+            n_shares_dynamic = max(1, (self.cash * 0.02) / price)
+            cost = price * n_shares_dynamic * (1 + self.fee_long)
+            if self.cash > cost:
+                self.cash -= cost
+                self.active_long.append(Position("long", n_shares_dynamic, price,
+                                                 price * (1 - self.stop_loss),
+                                                 price * (1 + self.take_profit)))
+                orders.append(Order("buy", n_shares_dynamic, price, "open_long", self.bar))
 
         # ---- OPEN SHORT ----
-        if signal == -1 and len(active_long) == 0:
-            n_shares_dynamic = max(1, (cash * 0.02) / price)
-            cost = price * n_shares_dynamic * (1 + FEE_SHORT)
-            if cash > cost:
-                cash -= cost
-                pos = Position("short", n_shares_dynamic, price,
-                               price * (1 + stop_loss),   # SL arriba
-                               price * (1 - take_profit)) # TP abajo
-                active_short.append(pos)
-
-        # ---- PORTFOLIO VALUE ----
-        # Cash + value of active positions
-        value_longs = sum(p.n_shares * price for p in active_long)
+        if signal == -1 and len(self.active_long) == 0:
+            n_shares_dynamic = max(1, (self.cash * 0.02) / price)
+            cost = price * n_shares_dynamic * (1 + self.fee_short)
+            if self.cash > cost:
+                self.cash -= cost
+                self.active_short.append(Position("short", n_shares_dynamic, price,
+                                                  price * (1 + self.stop_loss),
+                                                  price * (1 - self.take_profit)))
+                orders.append(Order("sell", n_shares_dynamic, price, "open_short", self.bar))
+
+        self.bar += 1
+        return orders
+
+    def equity(self, price: float) -> float:
+        """Cash + valor de las posiciones abiertas a `price`."""
+        value_longs = sum(p.n_shares * price for p in self.active_long)
         value_shorts = sum(
             (p.entry_price - price) * p.n_shares + (p.entry_price * p.n_shares)
-            for p in active_short
+            for p in self.active_short
         )
-        equity = cash + value_longs + value_shorts
-        portfolio_values.append(equity)
+        return self.cash + value_longs + value_shorts
 
-        trade_pnls.append(pnl_this_step if closed_any else 0)
-
-    # Force close all positions at the end
-    if len(df) > 0:
-        last_price = float(df.iloc[-1][price_col])
-
-        if active_long:
-            cash += last_price * sum(p.n_shares for p in active_long) * (1 - FEE_LONG)
-            active_long.clear()
-
-        if active_short:
-            for p in active_short:
-                pnl = (p.entry_price - last_price) * p.n_shares
-                cash += (pnl * (1 - FEE_SHORT)) + (p.entry_price * p.n_shares)
-            active_short.clear()
-
-
-        portfolio_values[-1] = cash
+def run_backtest(df, stop_loss=0.02, take_profit=0.04, n_shares=1,
+                 com=0.125/100, borrow_rate=0.25/100,
+                 price_col="close", initial_cash=1_000_000,
+                 cost_model=None, volume_col="volume btc",
+                 output="frame", stride=1):
+    """
+    output="frame" (default): devuelve (copia de df con 'portfolio_value' y
+    'trade_pnl', cash final).
+    output="compact": devuelve (BacktestResult, cash final), sin copiar df;
+    la equity se guarda cada `stride` barras y los trades en un array
+    estructurado (TRADE_DTYPE), así que la memoria escala con los trades.
+
+    Con `cost_model` (costs.CostModel) el loop corre sin comisiones y los
+    costos se descuentan después. El tamaño de cada posición y el chequeo
+    `cash > cost` usan el cash bruto, así que el resultado no coincide con el
+    de `com`/`borrow_rate` aun con sólo comisión, y el cash final puede quedar
+    por debajo de lo que la estrategia podía pagar. `volume_col` (en unidades
+    del activo, como `n_shares`) se usa para el impacto de mercado.
+    """
+    if output not in ("frame", "compact"):
+        raise ValueError(f"output desconocido: {output!r} (usa 'frame' o 'compact').")
+    if output == "frame" and stride != 1:
+        raise ValueError("stride > 1 sólo está disponible con output='compact'.")
+    compact = output == "compact"
+
+    # Con cost_model (costs.CostModel) el loop corre bruto y los costos se
+    # aplican vectorizados sobre los fills; com/borrow_rate se ignoran.
+    if cost_model is not None:
+        com, borrow_rate = 0.0, 0.0
+
+    # El loop de posiciones corre en kernels.backtest_loop (numba si está disponible)
+    n_bars = len(df)
+    portfolio_values, trade_pnls, cash, fills = kernels.backtest_loop(
+        df[price_col].to_numpy(dtype=float),
+        df["signal"].to_numpy(dtype=np.int64),  # 1=buy, 0=hold, -1=sell
+        stop_loss, take_profit, com, borrow_rate, initial_cash,
+        stride=stride, dense_pnl=not compact,
+    )
+
+    if cost_model is not None:
+        volume = None
+        if cost_model.needs_volume:
+            if volume_col not in df.columns:
+                raise ValueError(f"cost_model con impact_coef > 0 requiere la columna {volume_col!r}.")
+            volume = df[volume_col].to_numpy(dtype=float)
+        portfolio_values, trade_pnls, cash, fills = cost_model.apply(
+            portfolio_values, trade_pnls, cash, fills, volume,
+            bars=kernels.checkpoint_bars(n_bars, stride)
+        )
 
+    if compact:
+        return BacktestResult(portfolio_values, trades_from_fills(fills), cash, n_bars, stride), cash
 
+    df = df.copy()
     df["portfolio_value"] = portfolio_values
     df["trade_pnl"] = trade_pnls
 
     return df, cash
-
-
-
@@ -0,0 +1,68 @@
+"""
+Cold-start benchmark for the CLI
+
+Mide el tiempo total (proceso nuevo) de `python main.py <subcomando>` y lo
+compara con el arranque anterior, que importaba optuna, ta y matplotlib al
+inicio. También reporta qué módulos pesados quedaron cargados.
+
+    python bench_startup.py evaluate --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("optuna", "ta", "matplotlib")
+
+_RUN = (
+    "import sys, main; main.main(sys.argv[1:]); "
+    "print('__loaded__', ','.join(m for m in {heavy!r} if m in sys.modules), file=sys.stderr)"
+)
+_EAGER = "import optuna, ta, matplotlib.pyplot; "
+
+
+def _time_once(code, cli_args):
+    cmd = [sys.executable, "-c", code] + cli_args
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    loaded = ""
+    for line in proc.stderr.splitlines():
+        if line.startswith("__loaded__"):
+            loaded = line.split(" ", 1)[1] if " " in line else ""
+    return elapsed, loaded
+
+
+def bench(cli_args, repeat=5):
+    run = _RUN.format(heavy=HEAVY_MODULES)
+    results = {}
+    for label, code in (("lazy", run), ("eager", _EAGER + run)):
+        times = []
+        loaded = ""
+        for _ in range(repeat):
+            t, loaded = _time_once(code, cli_args)
+            times.append(t)
+        results[label] = (statistics.median(times), loaded)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args, cli_args = parser.parse_known_args(argv)
+    if not cli_args:
+        cli_args = ["evaluate"]
+
+    results = bench(cli_args, args.repeat)
+    print(f"main.py {' '.join(cli_args)}  (mediana de {args.repeat} corridas)")
+    for label, (t, loaded) in results.items():
+        print(f"  {label:<6} {t:7.3f}s   heavy modules: {loaded or '-'}")
+    lazy, eager = results["lazy"][0], results["eager"][0]
+    print(f"  speedup: {eager / lazy:.2f}x ({(1 - lazy / eager) * 100:.0f}% menos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Cost model: comisiones, slippage por volumen y borrow/funding por tiempo
+
+Trabaja sobre el log de fills que devuelve `kernels.backtest_loop` (una fila
+por posición cerrada, columnas en `kernels.FILL_COLUMNS`), así que todos los
+costos se calculan con operaciones de arrays, sin loops por barra. Cualquier
+motor que produzca ese log (el de `run_backtest` o uno batched) puede usarlo.
+
+    model = CostModel(commission=0.00125, borrow_rate=0.10, impact_coef=0.1)
+    df_bt, cash = run_backtest(df_sig, cost_model=model)   # volumen: 'volume btc'
+
+Con `cost_model`, el loop corre sin comisiones y los costos se descuentan
+después; el tamaño de las posiciones (2% del cash) se calcula sobre el cash
+bruto (ver `run_backtest`).
+"""
+
+from dataclasses import dataclass
+import numpy as np
+
+import kernels
+
+# Índices de columnas en el log de fills
+ENTRY_BAR = kernels.FILL_COLUMNS.index("entry_bar")
+EXIT_BAR = kernels.FILL_COLUMNS.index("exit_bar")
+SIDE = kernels.FILL_COLUMNS.index("side")
+N_SHARES = kernels.FILL_COLUMNS.index("n_shares")
+ENTRY_PRICE = kernels.FILL_COLUMNS.index("entry_price")
+EXIT_PRICE = kernels.FILL_COLUMNS.index("exit_price")
+FORCED = kernels.FILL_COLUMNS.index("forced")
+PNL = kernels.FILL_COLUMNS.index("pnl")
+N_FILL_COLUMNS = len(kernels.FILL_COLUMNS)
+
+
+@dataclass
+class CostModel:
+    """
+    Parámetros
+    ----------
+    commission : float
+        Comisión por lado, como fracción del notional (0.125% -> 0.00125).
+    spread_bps : float
+        Slippage fijo por lado, en puntos básicos.
+    impact_coef : float
+        Impacto de mercado por lado: `impact_coef * sqrt(n_shares / volume)`
+        como fracción del precio, con el volumen de la barra del fill.
+    borrow_rate : float
+        Tasa anual de préstamo para shorts, sobre el notional de entrada y
+        proporcional a las barras mantenidas.
+    funding_rate : float
+        Tasa anual de financiamiento para longs (0 si se opera spot).
+    bars_per_year : int
+        Barras por año (datos horarios 24/7 -> 24*365).
+    """
+    commission: float = 0.125 / 100
+    spread_bps: float = 0.0
+    impact_coef: float = 0.0
+    borrow_rate: float = 0.0
+    funding_rate: float = 0.0
+    bars_per_year: int = 24 * 365
+
+    @property
+    def needs_volume(self) -> bool:
+        """True si el modelo necesita el volumen por barra (impacto de mercado)."""
+        return self.impact_coef > 0
+
+    def _slippage_frac(self, shares, bars, volume):
+        frac = np.full(len(shares), self.spread_bps / 1e4)
+        if self.needs_volume:
+            if volume is None:
+                raise ValueError("impact_coef > 0 requiere la columna de volumen.")
+            vol = np.asarray(volume, dtype=float)[bars]
+            participation = np.divide(shares, vol, out=np.ones_like(shares), where=vol > 0)
+            frac += self.impact_coef * np.sqrt(np.minimum(participation, 1.0))
+        return frac
+
+    def fill_costs(self, fills, volume=None) -> dict:
+        """
+        Costos por fill (arrays alineados con las filas de `fills`).
+
+        Returns
+        -------
+        dict con 'entry' (comisión + slippage al abrir), 'exit' (comisión +
+        slippage al cerrar), 'carry' (borrow/funding por tiempo), 'carry_per_bar'
+        (lo que se devenga en cada barra mantenida) y 'total'.
+        """
+        fills = np.asarray(fills, dtype=float).reshape(-1, N_FILL_COLUMNS)
+        entry_bar = fills[:, ENTRY_BAR].astype(np.int64)
+        exit_bar = fills[:, EXIT_BAR].astype(np.int64)
+        shares = fills[:, N_SHARES]
+        entry_notional = fills[:, ENTRY_PRICE] * shares
+        exit_notional = fills[:, EXIT_PRICE] * shares
+
+        entry = entry_notional * (self.commission + self._slippage_frac(shares, entry_bar, volume))
+        exit_ = exit_notional * (self.commission + self._slippage_frac(shares, exit_bar, volume))
+
+        rate = np.where(fills[:, SIDE] < 0, self.borrow_rate, self.funding_rate)
+        carry_per_bar = entry_notional * rate / self.bars_per_year
+        carry = carry_per_bar * (exit_bar - entry_bar)
+
+        return {"entry": entry, "exit": exit_, "carry": carry, "carry_per_bar": carry_per_bar,
+                "total": entry + exit_ + carry}
+
+    def apply(self, portfolio_values, trade_pnls, cash, fills, volume=None, bars=None):
+        """
+        Descuenta los costos de un backtest bruto.
+
+        Los costos de entrada se registran en la barra de entrada, los de
+        salida en la de salida y el carry se devenga barra a barra en
+        [entrada, salida); la equity baja por el costo acumulado y `trade_pnls`
+        por el costo total de cada trade cerrado (los cierres forzados no
+        aparecen en `trade_pnls`, igual que en el motor original).
+
+        `bars` son las barras de cada valor de `portfolio_values` (None: una
+        por barra); `trade_pnls` puede venir vacío (modo compacto).
+
+        Returns
+        -------
+        (portfolio_values, trade_pnls, cash, fills) netos de costos; la
+        columna 'pnl' de `fills` también queda neta.
+        """
+        fills = np.array(fills, dtype=float).reshape(-1, N_FILL_COLUMNS)
+        portfolio_values = np.asarray(portfolio_values, dtype=float)
+        trade_pnls = np.asarray(trade_pnls, dtype=float)
+        if bars is None:
+            bars = np.arange(len(portfolio_values))
+        c = self.fill_costs(fills, volume)
+        entry_bar = fills[:, ENTRY_BAR].astype(np.int64)
+        exit_bar = fills[:, EXIT_BAR].astype(np.int64)
+
+        # Costos puntuales acumulados en cada punto de equity: eventos ordenados + searchsorted
+        event_bar = np.concatenate([entry_bar, exit_bar])
+        event_cost = np.concatenate([c["entry"], c["exit"]])
+        order = np.argsort(event_bar, kind="stable")
+        cum_cost = np.concatenate([[0.0], np.cumsum(event_cost[order])])
+        portfolio_values = portfolio_values - cum_cost[np.searchsorted(event_bar[order], bars, side="right")]
+
+        # Carry devengado hasta cada barra: la tasa por barra entra en la barra de
+        # entrada y sale en la de salida (array de diferencias); carry(b) = sum_{t<b} tasa(t)
+        if len(fills) and len(bars):
+            n = int(max(np.max(bars), exit_bar.max())) + 1
+            slope = (np.bincount(entry_bar, weights=c["carry_per_bar"], minlength=n)
+                     - np.bincount(exit_bar, weights=c["carry_per_bar"], minlength=n))
+            accrued = np.concatenate([[0.0], np.cumsum(np.cumsum(slope))])
+            portfolio_values = portfolio_values - accrued[bars]
+
+        if len(trade_pnls):
+            closed = fills[:, FORCED] == 0
+            trade_pnls = trade_pnls - np.bincount(exit_bar[closed], weights=c["total"][closed],
+                                                  minlength=len(trade_pnls))
+        fills[:, PNL] -= c["total"]
+        return portfolio_values, trade_pnls, float(cash - c["total"].sum()), fills
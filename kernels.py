@@ -0,0 +1,410 @@
+"""
+Numerical kernels for indicators and the backtest position loop.
+
+Si `numba` está instalado, las recurrencias (EMA, RSI de Wilder, desviación
+móvil y el loop de posiciones) se compilan con `@njit(cache=True)`; la
+compilación queda cacheada en disco, así que sólo la primera ejecución paga
+el costo. Si no está instalado, falla al importarse o se define
+TRADING_NO_JIT=1, se usa una implementación en NumPy puro con los mismos
+resultados (dentro de tolerancia).
+
+numba se importa recién en la primera llamada compilada, así que importar este
+módulo es barato; `USE_NUMBA = False` fuerza el camino NumPy en tiempo de ejecución.
+"""
+
+import os
+import importlib.util
+import numpy as np
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None  # numba es opcional
+
+USE_NUMBA = HAS_NUMBA and os.environ.get("TRADING_NO_JIT", "") not in ("1", "true", "True")
+
+_compiled = {}
+
+# Columnas del log de fills que devuelve `backtest_loop`
+FILL_COLUMNS = ("entry_bar", "exit_bar", "side", "n_shares", "entry_price", "exit_price", "forced", "pnl")
+
+
+def _jit(func, fallback):
+    """
+    Devuelve `func` compilada con numba (cacheada en memoria y en disco), o
+    `fallback` si USE_NUMBA está apagado o numba no se puede importar (p.ej.
+    instalado pero incompatible con la versión de NumPy); en ese caso se
+    apaga USE_NUMBA para el resto de la sesión.
+    """
+    global USE_NUMBA
+    if not USE_NUMBA:
+        return fallback
+    if func not in _compiled:
+        try:
+            from numba import njit
+        except ImportError:
+            USE_NUMBA = False
+            return fallback
+        _compiled[func] = njit(cache=True)(func)
+    return _compiled[func]
+
+
+# -------------------------
+# Pure-NumPy implementations
+# -------------------------
+def _ewm_numpy(x: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    y[0] = x[0];  y[t] = alpha * x[t] + (1 - alpha) * y[t-1]   (adjust=False)
+
+    Se resuelve por bloques con la forma cerrada
+    y[t0+k] = d^(k+1) * y[t0-1] + alpha * d^k * cumsum(x * d^-j),  d = 1 - alpha,
+    eligiendo el tamaño de bloque para que d^-k no desborde float64.
+    """
+    n = len(x)
+    out = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return out
+    d = 1.0 - alpha
+    if d <= 0.0:
+        out[:] = x
+        return out
+    block = int(min(1024, max(1, np.floor(250.0 / -np.log10(d)))))
+    powers = d ** np.arange(block + 1, dtype=np.float64)
+    inv_powers = 1.0 / powers[:-1]
+
+    out[0] = x[0]
+    prev = x[0]
+    start = 1
+    while start < n:
+        stop = min(start + block, n)
+        k = stop - start
+        seg = x[start:stop]
+        acc = np.cumsum(seg * inv_powers[:k])
+        out[start:stop] = powers[1:k + 1] * prev + alpha * powers[:k] * acc
+        prev = out[stop - 1]
+        start = stop
+    return out
+
+
+def _rolling_mean_std_numpy(x: np.ndarray, window: int):
+    """Media y desviación estándar (ddof=0) móviles; NaN hasta completar la ventana."""
+    n = len(x)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if window < 1 or n < window:
+        return mean, std
+    windows = np.lib.stride_tricks.sliding_window_view(x, window)
+    mean[window - 1:] = windows.mean(axis=1)
+    std[window - 1:] = windows.std(axis=1)
+    return mean, std
+
+
+# -------------------------
+# Kernels (compilables con numba)
+# -------------------------
+def _ewm_loop(x, alpha):
+    n = len(x)
+    out = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return out
+    d = 1.0 - alpha
+    out[0] = x[0]
+    for t in range(1, n):
+        out[t] = alpha * x[t] + d * out[t - 1]
+    return out
+
+
+def _rolling_mean_std_loop(x, window):
+    n = len(x)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if window < 1 or n < window:
+        return mean, std
+    for t in range(window - 1, n):
+        s = 0.0
+        for j in range(t - window + 1, t + 1):
+            s += x[j]
+        m = s / window
+        ss = 0.0
+        for j in range(t - window + 1, t + 1):
+            ss += (x[j] - m) * (x[j] - m)
+        mean[t] = m
+        std[t] = np.sqrt(ss / window)
+    return mean, std
+
+
+def _backtest_loop_impl(prices, signals, stop_loss, take_profit, com, borrow_rate, initial_cash,
+                        stride, dense_pnl):
+    """
+    Loop de posiciones de `run_backtest` sobre arrays.
+
+    Las posiciones abiertas viven en arrays 2-D (n_shares, entry, sl, tp, barra
+    de entrada) que crecen al doble cuando se llenan, y se compactan en orden
+    al cerrar para reproducir exactamente el orden de las listas originales.
+    Cada cierre se registra en `fills` (ver FILL_COLUMNS), que también crece
+    bajo demanda: la memoria escala con el número de trades, no de barras.
+
+    La equity se guarda cada `stride` barras (más la última); `trade_pnls` por
+    barra sólo se llena si `dense_pnl`.
+    """
+    n = len(prices)
+    fee_long = com
+    fee_short = com + borrow_rate
+
+    n_points = 0
+    if n > 0:
+        n_points = (n - 1) // stride + 1
+        if (n - 1) % stride != 0:
+            n_points += 1
+    portfolio_values = np.empty(n_points, dtype=np.float64)
+    trade_pnls = np.zeros(n if dense_pnl else 0, dtype=np.float64)
+
+    fills = np.empty((16, 8), dtype=np.float64)
+    n_fills = 0
+    longs = np.empty((16, 5), dtype=np.float64)   # n_shares, entry, sl, tp, entry_bar
+    n_long = 0
+    shorts = np.empty((16, 5), dtype=np.float64)
+    n_short = 0
+
+    cash = float(initial_cash)
+
+    for i in range(n):
+        price = prices[i]
+        signal = signals[i]
+        pnl_this_step = 0.0
+        closed_any = False
+
+        # ---- CLOSE LONGS ----
+        k = 0
+        for j in range(n_long):
+            sh = longs[j, 0]
+            entry = longs[j, 1]
+            if price >= longs[j, 3] or price <= longs[j, 2]:
+                entry_fee = entry * sh * fee_long
+                exit_fee = price * sh * fee_long
+                pnl_realized = (price - entry) * sh - entry_fee - exit_fee
+                pnl_this_step += pnl_realized
+                cash += price * sh * (1 - fee_long)
+                closed_any = True
+                if n_fills == fills.shape[0]:
+                    grown = np.empty((2 * n_fills, 8), dtype=np.float64)
+                    grown[:n_fills] = fills
+                    fills = grown
+                fills[n_fills, 0] = longs[j, 4]
+                fills[n_fills, 1] = i
+                fills[n_fills, 2] = 1.0
+                fills[n_fills, 3] = sh
+                fills[n_fills, 4] = entry
+                fills[n_fills, 5] = price
+                fills[n_fills, 6] = 0.0
+                fills[n_fills, 7] = pnl_realized
+                n_fills += 1
+            else:
+                if k != j:
+                    longs[k] = longs[j]
+                k += 1
+        n_long = k
+
+        # ---- CLOSE SHORTS ----
+        k = 0
+        for j in range(n_short):
+            sh = shorts[j, 0]
+            entry = shorts[j, 1]
+            if price <= shorts[j, 3] or price >= shorts[j, 2]:
+                pnl_gross = (entry - price) * sh
+                entry_fee = entry * sh * fee_short
+                exit_fee = price * sh * fee_short
+                pnl_realized = pnl_gross - entry_fee - exit_fee
+                pnl_this_step += pnl_realized
+                cash += (pnl_gross * (1 - fee_short)) + (entry * sh)
+                closed_any = True
+                if n_fills == fills.shape[0]:
+                    grown = np.empty((2 * n_fills, 8), dtype=np.float64)
+                    grown[:n_fills] = fills
+                    fills = grown
+                fills[n_fills, 0] = shorts[j, 4]
+                fills[n_fills, 1] = i
+                fills[n_fills, 2] = -1.0
+                fills[n_fills, 3] = sh
+                fills[n_fills, 4] = entry
+                fills[n_fills, 5] = price
+                fills[n_fills, 6] = 0.0
+                fills[n_fills, 7] = pnl_realized
+                n_fills += 1
+            else:
+                if k != j:
+                    shorts[k] = shorts[j]
+                k += 1
+        n_short = k
+
+        # ---- OPEN LONG ----
+        if signal == 1 and n_short == 0:
+            n_shares_dynamic = max(1.0, (cash * 0.02) / price)
+            cost = price * n_shares_dynamic * (1 + fee_long)
+            if cash > cost:
+                cash -= cost
+                if n_long == longs.shape[0]:
+                    grown = np.empty((2 * n_long, 5), dtype=np.float64)
+                    grown[:n_long] = longs
+                    longs = grown
+                longs[n_long, 0] = n_shares_dynamic
+                longs[n_long, 1] = price
+                longs[n_long, 2] = price * (1 - stop_loss)
+                longs[n_long, 3] = price * (1 + take_profit)
+                longs[n_long, 4] = i
+                n_long += 1
+
+        # ---- OPEN SHORT ----
+        if signal == -1 and n_long == 0:
+            n_shares_dynamic = max(1.0, (cash * 0.02) / price)
+            cost = price * n_shares_dynamic * (1 + fee_short)
+            if cash > cost:
+                cash -= cost
+                if n_short == shorts.shape[0]:
+                    grown = np.empty((2 * n_short, 5), dtype=np.float64)
+                    grown[:n_short] = shorts
+                    shorts = grown
+                shorts[n_short, 0] = n_shares_dynamic
+                shorts[n_short, 1] = price
+                shorts[n_short, 2] = price * (1 + stop_loss)
+                shorts[n_short, 3] = price * (1 - take_profit)
+                shorts[n_short, 4] = i
+                n_short += 1
+
+        # ---- PORTFOLIO VALUE ----
+        if i % stride == 0 or i == n - 1:
+            value_longs = 0.0
+            for j in range(n_long):
+                value_longs += longs[j, 0] * price
+            value_shorts = 0.0
+            for j in range(n_short):
+                value_shorts += (shorts[j, 1] - price) * shorts[j, 0] + (shorts[j, 1] * shorts[j, 0])
+            portfolio_values[(i + stride - 1) // stride] = cash + value_longs + value_shorts
+
+        if closed_any and dense_pnl:
+            trade_pnls[i] = pnl_this_step
+
+    # Force close all positions at the end
+    if n > 0:
+        last_price = prices[n - 1]
+        if n_long > 0:
+            total_sh = 0.0
+            for j in range(n_long):
+                total_sh += longs[j, 0]
+            cash += last_price * total_sh * (1 - fee_long)
+        for j in range(n_short):
+            pnl = (shorts[j, 1] - last_price) * shorts[j, 0]
+            cash += (pnl * (1 - fee_short)) + (shorts[j, 1] * shorts[j, 0])
+        portfolio_values[n_points - 1] = cash
+
+        # Cierres forzados: se registran aparte (no cuentan en trade_pnls)
+        if n_fills + n_long + n_short > fills.shape[0]:
+            grown = np.empty((n_fills + n_long + n_short, 8), dtype=np.float64)
+            grown[:n_fills] = fills[:n_fills]
+            fills = grown
+        for j in range(n_long):
+            sh = longs[j, 0]
+            fills[n_fills, 0] = longs[j, 4]
+            fills[n_fills, 1] = n - 1
+            fills[n_fills, 2] = 1.0
+            fills[n_fills, 3] = sh
+            fills[n_fills, 4] = longs[j, 1]
+            fills[n_fills, 5] = last_price
+            fills[n_fills, 6] = 1.0
+            fills[n_fills, 7] = (last_price - longs[j, 1]) * sh - (longs[j, 1] + last_price) * sh * fee_long
+            n_fills += 1
+        for j in range(n_short):
+            sh = shorts[j, 0]
+            fills[n_fills, 0] = shorts[j, 4]
+            fills[n_fills, 1] = n - 1
+            fills[n_fills, 2] = -1.0
+            fills[n_fills, 3] = sh
+            fills[n_fills, 4] = shorts[j, 1]
+            fills[n_fills, 5] = last_price
+            fills[n_fills, 6] = 1.0
+            fills[n_fills, 7] = (shorts[j, 1] - last_price) * sh - (shorts[j, 1] + last_price) * sh * fee_short
+            n_fills += 1
+
+    return portfolio_values, trade_pnls, cash, fills[:n_fills].copy()
+
+
+# -------------------------
+# API pública
+# -------------------------
+def _as_float_array(x) -> np.ndarray:
+    return np.ascontiguousarray(np.asarray(x, dtype=np.float64))
+
+
+def ewm(x, alpha: float, min_periods: int = 0) -> np.ndarray:
+    """Media exponencial con `adjust=False` (equivalente a `Series.ewm(...).mean()`)."""
+    x = _as_float_array(x)
+    out = _jit(_ewm_loop, _ewm_numpy)(x, float(alpha))
+    min_periods = int(min_periods)
+    if min_periods > 1:
+        out[:min_periods - 1] = np.nan
+    return out
+
+
+def ema(x, window: int) -> np.ndarray:
+    """EMA con span=window, igual a `ta.trend.EMAIndicator(...).ema_indicator()`."""
+    window = int(window)
+    return ewm(x, 2.0 / (window + 1.0), min_periods=window)
+
+
+def rsi_wilder(x, window: int = 14) -> np.ndarray:
+    """RSI de Wilder (alpha = 1/window), igual a `ta.momentum.RSIIndicator(...).rsi()`."""
+    x = _as_float_array(x)
+    window = int(window)
+    diff = np.empty_like(x)
+    if len(x):
+        diff[0] = 0.0
+        diff[1:] = np.diff(x)
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    avg_up = ewm(up, 1.0 / window, min_periods=window)
+    avg_down = ewm(down, 1.0 / window, min_periods=window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - 100.0 / (1.0 + avg_up / avg_down)
+    return np.where(avg_down == 0, 100.0, rsi)
+
+
+def rolling_mean_std(x, window: int):
+    """Media y desviación estándar móviles (ddof=0), como las Bandas de Bollinger de `ta`."""
+    x = _as_float_array(x)
+    return _jit(_rolling_mean_std_loop, _rolling_mean_std_numpy)(x, int(window))
+
+
+def backtest_loop(prices, signals, stop_loss, take_profit, com, borrow_rate, initial_cash,
+                  stride=1, dense_pnl=True):
+    """
+    Ejecuta el loop de posiciones de `run_backtest`.
+
+    Parameters
+    ----------
+    stride : int
+        Guarda la equity cada `stride` barras (barras 0, stride, 2*stride, ...
+        y siempre la última). Con stride=1 se guarda en todas.
+    dense_pnl : bool
+        Si False, no se arma el array `trade_pnls` por barra (queda vacío);
+        el PnL de cada trade está en la columna 'pnl' de `fills`.
+
+    Returns
+    -------
+    (portfolio_values, trade_pnls, final_cash, fills)
+        `fills` es un array (n_trades, 8) con una fila por posición cerrada;
+        columnas en FILL_COLUMNS.
+    """
+    stride = int(stride)
+    if stride < 1:
+        raise ValueError("stride debe ser >= 1")
+    prices = _as_float_array(prices)
+    signals = np.ascontiguousarray(np.asarray(signals, dtype=np.int64))
+    # Sin numba no hay forma vectorizada de la recurrencia: corre el mismo loop interpretado
+    loop = _jit(_backtest_loop_impl, _backtest_loop_impl)
+    return loop(prices, signals, float(stop_loss), float(take_profit),
+                float(com), float(borrow_rate), float(initial_cash), stride, bool(dense_pnl))
+
+
+def checkpoint_bars(n_bars, stride=1) -> np.ndarray:
+    """Barras a las que corresponde cada valor de equity devuelto con `stride`."""
+    bars = np.arange(0, n_bars, int(stride))
+    if n_bars > 0 and bars[-1] != n_bars - 1:
+        bars = np.append(bars, n_bars - 1)
+    return bars
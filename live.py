@@ -0,0 +1,205 @@
+"""
+Live paper trading con asyncio
+
+    ReplayFeed  --(cola acotada)-->  estrategia  --(cola acotada)-->  OrderSink
+    (klines tipo websocket)          SignalState + PositionBook         (registro de órdenes)
+
+`ReplayFeed` reemplaza al websocket de Binance reproduciendo el CSV a
+`speed`x (1000x -> una vela de 1h cada 3.6 s; 1e6x -> cada 3.6 ms). No hay
+matching engine: `PositionBook` asume ejecución al precio de la barra y
+`OrderSink` sólo registra las órdenes y la posición neta. Las colas son
+acotadas: si la estrategia o el consumidor de órdenes se atrasan, el
+productor espera (backpressure) y se cuenta cuántas veces pasó. La latencia barra-llegada -> decisión (incluye la
+espera en cola) y el cómputo de la decisión se registran en `LatencyHistogram`s.
+
+    python main.py paper --speed 1e6 --max-bars 5000
+"""
+
+import asyncio
+import bisect
+import math
+import time
+
+from signals import SignalState, SIGNAL_PARAMS
+from backtesting import PositionBook
+
+BAR_SECONDS = 3600
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets log-espaciados (en nanosegundos)."""
+
+    def __init__(self, min_ns=100, max_ns=10**9, bins_per_decade=20):
+        decades = math.log10(max_ns / min_ns)
+        n_edges = int(decades * bins_per_decade) + 1
+        self.edges = [min_ns * 10 ** (i / bins_per_decade) for i in range(n_edges)]
+        self.counts = [0] * (n_edges + 1)  # +1: overflow
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int):
+        self.counts[bisect.bisect_left(self.edges, ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q: float) -> float:
+        """Percentil aproximado (borde superior del bucket, acotado por el máximo observado), en ns."""
+        if self.count == 0:
+            return math.nan
+        target = q / 100.0 * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target and c:
+                return min(self.edges[i], self.max_ns) if i < len(self.edges) else self.max_ns
+        return self.max_ns
+
+    def summary(self) -> dict:
+        """Resumen en microsegundos."""
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1e3,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "p99.9_us": self.percentile(99.9) / 1e3,
+            "max_us": self.max_ns / 1e3,
+        }
+
+
+class ReplayFeed:
+    """
+    Stand-in local del stream de klines: reproduce un DataFrame con 'close'
+    (y opcionalmente 'date' y 'volume'; sin 'date' se usa el índice) como
+    mensajes tipo websocket, a `speed`x el tiempo real (speed=0: lo más
+    rápido posible).
+    """
+
+    def __init__(self, df, speed=1000.0, bar_seconds=BAR_SECONDS, queue_size=64):
+        self.df = df
+        self.interval = bar_seconds / speed if speed else 0.0
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.backpressure_waits = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        dates = self.df.get("date", self.df.index).astype(str).tolist()
+        closes = self.df["close"].astype(str).tolist()
+        volumes = (self.df["volume"].astype(str).tolist() if "volume" in self.df.columns
+                   else ["0"] * len(closes))
+        t0 = loop.time()
+        for i, (date, close, volume) in enumerate(zip(dates, closes, volumes)):
+            if self.interval:
+                delay = t0 + i * self.interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if self.queue.full():
+                self.backpressure_waits += 1
+            # "E": instante de llegada de la barra (perf_counter_ns)
+            msg = {"e": "kline", "E": time.perf_counter_ns(),
+                   "k": {"t": date, "c": close, "v": volume, "x": True}}
+            await self.queue.put(msg)
+        await self.queue.put(None)
+
+    async def recv(self):
+        """Siguiente mensaje, o None al terminar el replay."""
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self.recv()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+
+class OrderSink:
+    """
+    Destino de órdenes del paper trading: las consume de una cola acotada, las
+    guarda en `received` y acumula la posición neta. No devuelve fills; el
+    cash y las posiciones los lleva `PositionBook`, que asume ejecución al
+    precio de la barra, así que `position` coincide con su posición neta.
+    """
+
+    def __init__(self, queue_size=256):
+        self.orders = asyncio.Queue(maxsize=queue_size)
+        self.received = []
+        self.position = 0.0
+        self.backpressure_waits = 0
+
+    async def submit(self, order):
+        if self.orders.full():
+            self.backpressure_waits += 1
+        await self.orders.put(order)
+
+    async def close(self):
+        await self.orders.put(None)
+
+    async def run(self):
+        while True:
+            order = await self.orders.get()
+            if order is None:
+                break
+            qty = order.n_shares if order.side == "buy" else -order.n_shares
+            self.position += qty
+            self.received.append(order)
+
+
+async def run_paper_trading(df, params=None, speed=1000.0, feed_queue=64, order_queue=256,
+                            com=0.125/100, borrow_rate=0.25/100, initial_cash=1_000_000):
+    """
+    Corre la estrategia sobre el replay y devuelve un reporte con órdenes,
+    equity final (mark-to-market) y el histograma de latencias de decisión.
+
+    `params` usa las mismas claves que `data/best_params_optuna.csv`; si es
+    None se usan los valores por defecto de `make_signals`/`run_backtest`.
+    """
+    params = dict(params or {})
+    signal_state = SignalState(**{k: params[k] for k in SIGNAL_PARAMS if k in params})
+    book = PositionBook(stop_loss=params.get("stop_loss_pct", 0.02),
+                        take_profit=params.get("take_profit_pct", 0.04),
+                        com=com, borrow_rate=borrow_rate, initial_cash=initial_cash)
+
+    feed = ReplayFeed(df, speed=speed, queue_size=feed_queue)
+    sink = OrderSink(queue_size=order_queue)
+    hist = LatencyHistogram()
+    compute_hist = LatencyHistogram()
+    last_price = None
+
+    async def strategy():
+        nonlocal last_price
+        async for msg in feed:
+            t_recv = time.perf_counter_ns()
+            price = float(msg["k"]["c"])
+            signal = signal_state.update(price)
+            orders = book.step(price, signal)
+            t_decision = time.perf_counter_ns()
+            hist.record(t_decision - msg["E"])
+            compute_hist.record(t_decision - t_recv)
+            last_price = price
+            for order in orders:
+                await sink.submit(order)
+        await sink.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(feed.run(), strategy(), sink.run())
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "bars": hist.count,
+        "orders": len(sink.received),
+        "net_position": sink.position,
+        "final_equity": book.equity(last_price) if last_price is not None else book.cash,
+        "elapsed_s": elapsed,
+        "feed_backpressure_waits": feed.backpressure_waits,
+        "order_backpressure_waits": sink.backpressure_waits,
+        "latency": hist.summary(),
+        "compute_latency": compute_hist.summary(),
+        "histogram": hist,
+    }
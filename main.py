@@ -1,88 +1,248 @@
 """
-Main pipeline orchestrator - runs the complete workflow
+Main pipeline orchestrator - CLI entry point
+
+Subcomandos:
+    python main.py backtest   [--params data/best_params_optuna.csv]
+    python main.py optimize   [--trials 120 --jobs 1 --store results]
+    python main.py evaluate   [--params data/best_params_optuna.csv --split test]
+    python main.py plot       [--params ...] [--save-path outputs/plot_perf.png]
+    python main.py paper      [--params ...] [--speed 1000 --max-bars 5000]
+    python main.py sensitivity [--store results --oat --save-path outputs/sensitivity.png]
+
+Los módulos pesados (optuna, matplotlib, ta, numba) se importan sólo dentro
+del subcomando que los necesita, para que `evaluate` arranque rápido
+(ver `bench_startup.py`).
 """
-import pandas as pd
-import numpy as np
-import ta
+import argparse
 import os
-from plotting import plot_portfolio_vs_benchmark
-from signals import make_signals
-from backtesting import run_backtest
-from pfmn_metrics import calculate_all_metrics
-# from visualization import plot_results
-from optimization import optimize_strategy, print_optimization_results, split_train_test, evaluate_on_df, save_best_results
-
-df = pd.read_csv("data/Binance_BTCUSDT_1h.csv")
-df = df.iloc[::-1].reset_index(drop=True)
-df.columns = df.columns.str.strip().str.lower()
-
-
-
-# Generate buy/sell signals
-df_signals = make_signals(df)
-
-# Run backtest
-df_bt, final_capital = run_backtest(
-    df_signals,
-    stop_loss=0.02,
-    take_profit=0.04,
-    n_shares=1,
-    com=0.125/100,
-    borrow_rate=0.25/100,
-    price_col="close",
-    initial_cash=1_000_000
-)
-
-print(f"Final portfolio value (capital): {final_capital:,.2f}")
-print(df_bt[["date", "close", "portfolio_value"]].tail())
-
-# Calculate performance metrics
-metrics = calculate_all_metrics(df_bt, risk_free_rate=0.0, bars_per_year=24 * 365)
-
-print("PERFORMANCE SUMMARY")
-print("-" * 40)
-for k, v in metrics.items():
-    print(f"{k}: {v}")
-
-# Run optimization
-study, best_params, (df_train, df_test, df_val) = optimize_strategy(
-    df,           # pásale el DF crudo (sin señales)
-    n_trials=120, # > 50 like you asked
-    n_jobs=1      # pon >1 si tu entorno lo soporta
-)
-print_optimization_results(study)
-
-# Save best params to CSV
-save_best_results(best_params, "data/best_params_optuna.csv")
-best_params_path = "data/best_params_optuna.csv"
-
-if os.path.exists(best_params_path):
-    best_params = pd.read_csv(best_params_path).iloc[0].to_dict()
-    print("\n✅ Best parameters loaded from CSV")
-else:
-    # Si no existe, correr optimización y guardar resultados
-    study, best_params, (df_train, df_test, df_val) = optimize_strategy(df, n_trials=100, n_jobs=1)
+import sys
+
+DATA_PATH = "data/Binance_BTCUSDT_1h.csv"
+BEST_PARAMS_PATH = "data/best_params_optuna.csv"
+PLOT_PATH = "outputs/plot_perf.png"
+
+COM = 0.125 / 100
+BORROW_RATE = 0.25 / 100
+INITIAL_CASH = 1_000_000
+
+# Valores por defecto de make_signals / run_backtest (sin archivo de parámetros)
+DEFAULT_PARAMS = {
+    "rsi_period": 14, "rsi_overbought": 70, "rsi_oversold": 30,
+    "ema_short": 8, "ema_long": 21, "bb_window": 20, "bb_std": 2,
+    "n_shares": 1, "stop_loss_pct": 0.02, "take_profit_pct": 0.04,
+}
+
+
+def load_data(path=DATA_PATH):
+    """Carga el CSV de Binance en orden cronológico y con columnas en minúsculas."""
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df = df.iloc[::-1].reset_index(drop=True)
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+
+def load_params(path=BEST_PARAMS_PATH):
+    import pandas as pd
+
+    return pd.read_csv(path).iloc[0].to_dict()
+
+
+def print_metrics(metrics, title="PERFORMANCE SUMMARY"):
+    print(title)
+    print("-" * 40)
+    for k, v in metrics.items():
+        if k in ("total_return", "max_drawdown", "win_rate"):
+            print(f"{k}: {float(v)*100:.2f}%")
+        else:
+            print(f"{k}: {float(v):.4f}")
+
+
+def _backtest_with_params(df, params):
+    """Backtest con parámetros guardados, o con los valores por defecto si `params` es None."""
+    from optimization import evaluate_on_df
+
+    return evaluate_on_df(df, dict(params if params is not None else DEFAULT_PARAMS))
+
+
+# -------------------------
+# Subcomandos
+# -------------------------
+def cmd_backtest(args):
+    df = load_data(args.data)
+    params = load_params(args.params) if args.params else None
+    df_bt, final_capital, metrics = _backtest_with_params(df, params)
+
+    print(f"Final portfolio value (capital): {final_capital:,.2f}")
+    print(df_bt[["date", "close", "portfolio_value"]].tail())
+    print_metrics(metrics)
+
+
+def cmd_optimize(args):
+    from optimization import optimize_strategy, print_optimization_results, save_best_results
+
+    store = None
+    if args.store:
+        from results_store import ResultsStore
+        store = ResultsStore(args.store)
+
+    df = load_data(args.data)
+    study, best_params, _splits = optimize_strategy(
+        df,           # pásale el DF crudo (sin señales)
+        n_trials=args.trials,
+        n_jobs=args.jobs,
+        store=store
+    )
     print_optimization_results(study)
-    save_best_results(best_params, best_params_path)
-
-# Usar los parámetros guardados para backtesting
-df_train, df_test, df_val = split_train_test(df)
-df_bt_test, cash_test, m_test = evaluate_on_df(df_test, best_params)
-
-print("\n=== TEST METRICS ===")
-for k, v in m_test.items():
-    if k in ("total_return", "max_drawdown", "win_rate"):
-        print(f"{k}: {float(v)*100:.2f}%")
-    else:
-        print(f"{k}: {float(v):.4f}")
-print(f"Final portfolio (test): {cash_test:,.2f}")
-
-# Plot portfolio vs benchmark
-plot_portfolio_vs_benchmark(
-    portfolio_history=df_bt,
-    df=df,
-    benchmark_col="close",
-    normalize=True,
-    title="Estrategia vs Buy & Hold (BTC/USDT)",
-    save_path="outputs/plot_perf.png"
-)
\ No newline at end of file
+    save_best_results(best_params, args.out)
+
+
+def cmd_evaluate(args):
+    import kernels
+    from optimization import split_train_test, evaluate_on_df
+
+    # Una sola corrida corta: cargar numba cuesta más que el loop en NumPy
+    kernels.USE_NUMBA = kernels.USE_NUMBA and args.jit
+
+    if not os.path.exists(args.params):
+        sys.exit(f"No existe {args.params}; corre primero `python main.py optimize`.")
+
+    df = load_data(args.data)
+    best_params = load_params(args.params)
+    df_train, df_test, df_val = split_train_test(df)
+    df_split = {"train": df_train, "test": df_test, "val": df_val}[args.split]
+
+    _df_bt, cash, metrics = evaluate_on_df(df_split, best_params)
+    print_metrics(metrics, title=f"=== {args.split.upper()} METRICS ===")
+    print(f"Final portfolio ({args.split}): {cash:,.2f}")
+
+
+def cmd_plot(args):
+    from plotting import plot_portfolio_vs_benchmark
+
+    df = load_data(args.data)
+    params = load_params(args.params) if args.params else None
+    df_bt, _final_capital, _metrics = _backtest_with_params(df, params)
+
+    plot_portfolio_vs_benchmark(
+        portfolio_history=df_bt,
+        df=df,
+        benchmark_col="close",
+        normalize=True,
+        title="Estrategia vs Buy & Hold (BTC/USDT)",
+        show=not args.no_show,
+        save_path=args.save_path
+    )
+
+
+def cmd_paper(args):
+    import asyncio
+    from live import run_paper_trading
+
+    df = load_data(args.data)
+    if args.max_bars:
+        df = df.iloc[-args.max_bars:].reset_index(drop=True)
+    params = load_params(args.params) if args.params else None
+
+    report = asyncio.run(run_paper_trading(df, params, speed=args.speed,
+                                           com=COM, borrow_rate=BORROW_RATE,
+                                           initial_cash=INITIAL_CASH))
+
+    print(f"=== PAPER TRADING ({args.speed:g}x) ===")
+    print(f"Bars: {report['bars']}  Orders: {report['orders']}  Elapsed: {report['elapsed_s']:.2f}s")
+    print(f"Final equity (mark-to-market): {report['final_equity']:,.2f}")
+    print(f"Backpressure waits (feed/orders): {report['feed_backpressure_waits']}"
+          f"/{report['order_backpressure_waits']}")
+    for title, key in (("Decision latency (bar arrival -> orders)", "latency"),
+                       ("Compute latency (dequeue -> orders)", "compute_latency")):
+        print(f"{title}:")
+        for k, v in report[key].items():
+            print(f"  {k}: {v:.1f}" if k != "count" else f"  {k}: {v}")
+
+
+def cmd_sensitivity(args):
+    from results_store import ResultsStore
+    from sensitivity import sensitivity_report
+
+    df_split = best_params = None
+    if args.oat:
+        from optimization import split_train_test
+
+        # Mismo split que la optimización (validación)
+        _train, _test, df_split = split_train_test(load_data(args.data))
+        best_params = load_params(args.params)
+
+    report = sensitivity_report(ResultsStore(args.store), metric=args.metric,
+                                df=df_split, best_params=best_params)
+
+    print(f"=== SENSITIVITY ({report['metric']}, {report['n_trials']} trials, "
+          f"surrogate R²={report['r2']:.3f}) ===")
+    print(report["importance"].to_string(index=False, float_format="%.4f"))
+    print("\nInteractions:")
+    print(report["interactions"].to_string(index=False, float_format="%.4f"))
+    if report["oat"] is not None:
+        print("\nOne-at-a-time around best params:")
+        oat = report["oat"]
+        summary = oat.groupby("param")[args.metric].agg(["min", "max"])
+        summary["range"] = summary["max"] - summary["min"]
+        print(summary.sort_values("range", ascending=False).to_string(float_format="%.4f"))
+
+    if args.save_path:
+        from plotting import plot_sensitivity
+        plot_sensitivity(report, show=False, save_path=args.save_path)
+        print(f"\nPlot saved to {args.save_path}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="BTC/USDT RSI + EMA + Bollinger strategy")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV de velas de Binance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backtest", help="Backtest sobre todo el histórico")
+    p.add_argument("--params", default=None, help="CSV de parámetros (por defecto, valores base)")
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser("optimize", help="Optimización con Optuna (maximiza Calmar)")
+    p.add_argument("--trials", type=int, default=120)
+    p.add_argument("--jobs", type=int, default=1)
+    p.add_argument("--out", default=BEST_PARAMS_PATH)
+    p.add_argument("--store", default=None, help="Directorio donde guardar los resultados por trial")
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser("evaluate", help="Evalúa parámetros guardados en un split")
+    p.add_argument("--params", default=BEST_PARAMS_PATH)
+    p.add_argument("--split", choices=("train", "test", "val"), default="test")
+    p.add_argument("--jit", action="store_true", help="Usar kernels numba (por defecto NumPy)")
+    p.set_defaults(func=cmd_evaluate)
+
+    p = sub.add_parser("plot", help="Gráfica estrategia vs buy & hold")
+    p.add_argument("--params", default=None)
+    p.add_argument("--save-path", default=PLOT_PATH)
+    p.add_argument("--no-show", action="store_true")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("paper", help="Paper trading asyncio sobre un replay del CSV")
+    p.add_argument("--params", default=None)
+    p.add_argument("--speed", type=float, default=1000.0, help="Velocidad del replay (0 = sin pausa)")
+    p.add_argument("--max-bars", type=int, default=None, help="Reproducir sólo las últimas N barras")
+    p.set_defaults(func=cmd_paper)
+
+    p = sub.add_parser("sensitivity", help="Importancia y dependencia parcial sobre trials guardados")
+    p.add_argument("--store", default="results", help="Directorio del ResultsStore")
+    p.add_argument("--metric", default="calmar_ratio")
+    p.add_argument("--oat", action="store_true", help="Agregar barrido one-at-a-time alrededor de --params")
+    p.add_argument("--params", default=BEST_PARAMS_PATH)
+    p.add_argument("--save-path", default=None, help="Guardar gráfica (p.ej. outputs/sensitivity.png)")
+    p.set_defaults(func=cmd_sensitivity)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
-import optuna
 import json
+from typing import TYPE_CHECKING
 import numpy as np
 import pandas as pd
-from signals import make_signals
+from signals import make_signals, SIGNAL_PARAMS
 from backtesting import run_backtest
-from pfmn_metrics import calculate_all_metrics
+from pfmn_metrics import calculate_all_metrics, BARS_PER_YEAR_DEFAULT
+
+if TYPE_CHECKING:
+    import optuna  # sólo para anotaciones; se importa en optimize_strategy
 
 
 # Split data function
@@ -30,85 +33,77 @@ def split_train_test(df, train_ratio=0.6, test_ratio=0.2, val_ratio=0.2):
 
     return train_df, test_df, val_df
 
+# Valor que devuelve `objective` para trials inválidos (error o < MIN_CLOSED_TRADES trades)
+INVALID_SCORE = -1e6
+MIN_CLOSED_TRADES = 5
+
+# Search space: (low, high, type); `objective` sugiere cada parámetro desde aquí
+PARAM_SPACE = {
+    'rsi_period': (10, 30, int),
+    'rsi_overbought': (65, 80, int),
+    'rsi_oversold': (20, 35, int),
+    'ema_short': (10, 25, int),
+    'ema_long': (30, 80, int),
+    'bb_window': (10, 40, int),
+    'bb_std': (1.5, 3.0, float),
+    'n_shares': (0.5, 5.0, float),
+    'stop_loss_pct': (0.03, 0.06, float),
+    'take_profit_pct': (0.12, 0.25, float),
+}
+
 # Objective function (maximize Calmar ratio)
-def objective(trial, df):
+def objective(trial, df, store=None):
     """
     Optuna objective function to maximize Calmar ratio
+
+    Si se pasa `store` (ResultsStore), guarda equity, trades y métricas del trial,
+    con una columna 'valid' (False si el trial devolvió INVALID_SCORE).
     """
-    # Hyperparameters
-    rsi_period = trial.suggest_int('rsi_period', 10, 30)
-    rsi_overbought = trial.suggest_int('rsi_overbought', 65, 80)
-    rsi_oversold = trial.suggest_int('rsi_oversold', 20, 35)
-    
-    ema_short = trial.suggest_int('ema_short', 10, 25)
-    ema_long = trial.suggest_int('ema_long', 30, 80)
-    
-    bb_window = trial.suggest_int('bb_window', 10, 40)
-    bb_std = trial.suggest_float('bb_std', 1.5, 3.0)
-    
-    n_shares = trial.suggest_float('n_shares', 0.5, 5.0)
-    stop_loss_pct = trial.suggest_float('stop_loss_pct', 0.03, 0.06)
-    take_profit_pct = trial.suggest_float('take_profit_pct', 0.12, 0.25)
-    
-    # Build parameter dictionaries
-    rsi_params = {
-        'period': rsi_period,
-        'overbought': rsi_overbought,
-        'oversold': rsi_oversold
-    }
-    
-    ema_params = {
-        'short_period': ema_short,
-        'long_period': ema_long
-    }
-    
-    bb_params = {
-        'window': bb_window,
-        'std': bb_std
-    }
-    
+    # Hyperparameters (rangos y tipos en PARAM_SPACE)
+    params = {}
+    for name, (low, high, kind) in PARAM_SPACE.items():
+        suggest = trial.suggest_int if kind is int else trial.suggest_float
+        params[name] = suggest(name, low, high)
+
     # Generate signals
     try:
-        df_sig = make_signals(
-            df,
-            rsi_period=rsi_params['period'],
-            rsi_overbought=rsi_params['overbought'],
-            rsi_oversold=rsi_params['oversold'],
-            ema_short=ema_params['short_period'],
-            ema_long=ema_params['long_period'],
-            bb_window=bb_params['window'],
-            bb_std=bb_params['std']
-        )
+        df_sig = make_signals(df, **{k: params[k] for k in SIGNAL_PARAMS})
     except Exception:
-        return -1e6
+        return INVALID_SCORE
     
-    # Run backtest
+    # Run backtest (salida compacta: equity en array + log de trades)
     try:
-        df_bt, _final_capital = run_backtest(
+        result, _final_capital = run_backtest(
             df_sig,
-            stop_loss=stop_loss_pct,
-            take_profit=take_profit_pct,
-            n_shares=n_shares,
+            stop_loss=params['stop_loss_pct'],
+            take_profit=params['take_profit_pct'],
+            n_shares=params['n_shares'],
             com=0.125/100,
             borrow_rate=0.25/100,
             price_col="close",
-            initial_cash=1_000_000
+            initial_cash=1_000_000,
+            output="compact"
         )
     except Exception:
-        return -1e6
+        return INVALID_SCORE
     
     # Calculate metrics
-    metrics = calculate_all_metrics(df_bt, risk_free_rate=0.0, bars_per_year=24*365)
+    trades = result.closed_trades
+    metrics = calculate_all_metrics(result.to_frame(), risk_free_rate=0.0,
+                                    bars_per_year=BARS_PER_YEAR_DEFAULT,
+                                    trade_pnl=trades["pnl"], stride=result.stride)
     calmar = metrics.get("calmar_ratio", np.nan)
 
     # Ensure at least 5 closed trades to consider valid
-    closed_trades = int(df_bt.get("trade_pnl", pd.Series(dtype=float)).dropna().shape[0]) \
-                    if "trade_pnl" in df_bt.columns else 0
-    if closed_trades < 5:
-        return -1e6
+    closed_trades = len(trades)
+    valid = closed_trades >= MIN_CLOSED_TRADES and calmar is not None and not np.isnan(calmar)
+    if store is not None:
+        store.append(trial.number, trial.params,
+                     dict(metrics, closed_trades=closed_trades, valid=valid),
+                     result.equity, trades, stride=result.stride, n_bars=result.n_bars)
 
-    if calmar is None or np.isnan(calmar):
-        return -1e6
+    if not valid:
+        return INVALID_SCORE
 
     # Guarda info útil del trial para inspección
     trial.set_user_attr("closed_trades", closed_trades)
@@ -123,11 +118,14 @@ def objective(trial, df):
 # Run optimization
 def optimize_strategy(df, n_trials=100, n_jobs=1,
                       train_ratio=0.6, test_ratio=0.2, val_ratio=0.2,
-                      use_pruner=True):
+                      use_pruner=True, store=None):
     """
     Run Optuna optimization
+
+    `store` (ResultsStore, opcional) persiste los resultados de cada trial.
     """
-    
+    import optuna
+
     if n_trials < 50:
         n_trials = 50
 
@@ -140,15 +138,19 @@ def optimize_strategy(df, n_trials=100, n_jobs=1,
 
     # Objective envuelto para optimizar en VALIDACIÓN (no en train)
     def _obj(trial):
-        return objective(trial, df=val_df)
+        return objective(trial, df=val_df, store=store)
 
-    # Ejecuta
-    study.optimize(_obj, n_trials=n_trials, n_jobs=n_jobs, show_progress_bar=False)
+    # Ejecuta (si se interrumpe, igual se escriben los trials ya guardados en el buffer)
+    try:
+        study.optimize(_obj, n_trials=n_trials, n_jobs=n_jobs, show_progress_bar=False)
+    finally:
+        if store is not None:
+            store.flush()
 
     return study, study.best_params, (train_df, test_df, val_df)
 
 # Print optimization results
-def print_optimization_results(study: optuna.Study):
+def print_optimization_results(study: "optuna.Study"):
     """
     Print optimization results
     """
@@ -172,7 +174,7 @@ def evaluate_on_df(df, params):
         bb_window=params['bb_window'],
         bb_std=params['bb_std'],
     )
-    df_bt, final_capital = run_backtest(
+    result, final_capital = run_backtest(
         df_sig,
         stop_loss=params['stop_loss_pct'],
         take_profit=params['take_profit_pct'],
@@ -181,12 +183,20 @@ def evaluate_on_df(df, params):
         borrow_rate=0.25/100,
         price_col="close",
         initial_cash=1_000_000,
+        output="compact"
+    )
+    # Mismas columnas que output="frame"; el win rate es por trade, igual que en `objective`
+    trades = result.closed_trades
+    df_bt = df_sig.assign(
+        portfolio_value=result.equity,
+        trade_pnl=np.bincount(trades["bar"], weights=trades["pnl"], minlength=len(df_sig)),
     )
-    metrics = calculate_all_metrics(df_bt, risk_free_rate=0.0, bars_per_year=24*365)
+    metrics = calculate_all_metrics(df_bt, risk_free_rate=0.0,
+                                    bars_per_year=BARS_PER_YEAR_DEFAULT,
+                                    trade_pnl=trades["pnl"])
     return df_bt, final_capital, metrics
 
 def save_best_results(best_params, file_path="data/best_params_optuna.csv"):
-    import pandas as pd
     pd.DataFrame([best_params]).to_csv(file_path, index=False)
     print(f"\nBest parameters saved to {file_path}")
 
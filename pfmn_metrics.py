@@ -91,15 +91,32 @@ def _total_return(df: pd.DataFrame) -> float:
 # -------------------------
 def calculate_all_metrics(portfolio_hist: pd.DataFrame,
                           risk_free_rate: float = 0.0,
-                          bars_per_year: int = 365*24) -> dict:
+                          bars_per_year: int = 365*24,
+                          trade_pnl=None,
+                          stride: int = 1) -> dict:
+    """
+    Métricas de desempeño a partir de 'portfolio_value'. Si se pasa
+    `trade_pnl` (PnL por trade, p.ej. `BacktestResult.closed_trades["pnl"]`),
+    el win rate se calcula por trade en vez de con la columna 'trade_pnl'.
+
+    `stride` es el número de barras entre filas de `portfolio_hist` (p.ej.
+    `BacktestResult.stride`); las métricas anualizadas usan
+    `bars_per_year / stride` periodos por año.
+    """
+    if stride < 1:
+        raise ValueError("stride debe ser >= 1")
+    periods_per_year = bars_per_year / stride
     returns = portfolio_hist["portfolio_value"].pct_change().dropna()
 
     total_ret = portfolio_hist["portfolio_value"].iloc[-1] / portfolio_hist["portfolio_value"].iloc[0] - 1.0
-    sh = sharpe_ratio(returns, bars_per_year=bars_per_year, rf=risk_free_rate)
-    so = sortino_ratio(returns, bars_per_year=bars_per_year, rf=risk_free_rate)
+    sh = sharpe_ratio(returns, bars_per_year=periods_per_year, rf=risk_free_rate)
+    so = sortino_ratio(returns, bars_per_year=periods_per_year, rf=risk_free_rate)
     mdd, _ = max_drawdown(portfolio_hist["portfolio_value"])
-    cal = calmar_ratio(portfolio_hist["portfolio_value"], bars_per_year=bars_per_year)
-    wr = win_rate(portfolio_hist)  # <-- aquí
+    cal = calmar_ratio(portfolio_hist["portfolio_value"], bars_per_year=periods_per_year)
+    if trade_pnl is None:
+        wr = win_rate(portfolio_hist)  # <-- aquí
+    else:
+        wr = win_rate(pd.DataFrame({"trade_pnl": np.asarray(trade_pnl, dtype=float)}))
 
     return {
         "total_return": total_ret,
@@ -198,3 +198,53 @@ def plot_portfolio_vs_benchmark(
 
     return ax
 
+
+def plot_sensitivity(report: dict, *, top_n: int = 4, show: bool = True, save_path: str = None):
+    """
+    Plot a sensitivity report from `sensitivity.sensitivity_report`.
+
+    Panel 1: importancia (fANOVA) por parámetro. Paneles siguientes: PD 1-D
+    de los `top_n` parámetros más importantes y PD 2-D del par con mayor
+    interacción (si existe).
+    """
+    metric = report["metric"]
+    imp = report["importance"]
+    top = list(imp["param"].head(top_n))
+    n_panels = 1 + len(top) + (report["pd_2d"] is not None)
+    n_cols = min(3, n_panels)
+    n_rows = -(-n_panels // n_cols)
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(4.5 * n_cols, 3.5 * n_rows), squeeze=False)
+    axes = axes.ravel()
+
+    ax = axes[0]
+    ax.barh(imp["param"][::-1], imp["importance"][::-1])
+    ax.set_title(f"Importance ({metric}, R²={report['r2']:.2f})")
+    ax.grid(True, linestyle="--", alpha=0.25)
+
+    for ax, name in zip(axes[1:], top):
+        grid, pd_vals = report["pd_1d"][name]
+        ax.plot(grid, pd_vals, marker="o", markersize=3)
+        ax.set_title(f"PD: {name}")
+        ax.set_xlabel(name)
+        ax.set_ylabel(metric)
+        ax.grid(True, linestyle="--", alpha=0.25)
+
+    if report["pd_2d"] is not None:
+        a, b, ga, gb, surf = report["pd_2d"]
+        ax = axes[1 + len(top)]
+        mesh = ax.pcolormesh(gb, ga, surf, shading="auto")
+        fig.colorbar(mesh, ax=ax, label=metric)
+        ax.set_title(f"PD: {a} x {b}")
+        ax.set_xlabel(b)
+        ax.set_ylabel(a)
+
+    for ax in axes[n_panels:]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
+    if save_path:
+        os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+        fig.savefig(save_path, dpi=120)
+    if show:
+        plt.show()
+    return fig
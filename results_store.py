@@ -0,0 +1,237 @@
+"""
+Results store for optimization trials
+
+Guarda por trial la curva de equity (float32), el PnL de los trades cerrados
+y las métricas, en archivos columnares por bloques (chunks) más un índice
+pequeño con parámetros y métricas:
+
+    results/
+        index.csv                 una fila por trial (row_id, run, params, métricas, offsets,
+                                  n_bars y stride de la curva de equity)
+        chunk_00000_equity.npy    equity de todos los trials del chunk, concatenada
+        chunk_00000_trades.npy    PnL de trades cerrados (float64)
+        chunk_00000_bars.npy      índice de barra de cada trade (int32)
+
+Cada fila tiene un `row_id` único en todo el store y el número de corrida
+(`run`, uno por cada `ResultsStore` abierto sobre el directorio), porque el
+número de trial de Optuna vuelve a 0 en cada estudio. Las consultas filtran
+sobre el índice y sólo leen las curvas necesarias, con
+`np.load(..., mmap_mode="r")`, sin volver a correr backtests:
+
+    store = ResultsStore("results")
+    top = store.query("max_drawdown > -0.20", sort_by="calmar_ratio", top=50)
+    curves = store.load_equity(top)
+
+Con backtests compactos (`stride > 1`) cada curva tiene un punto cada
+`stride` barras; `load_equity_frames` las devuelve indexadas por barra y la
+columna 'stride' del índice va a `calculate_all_metrics(..., stride=...)`.
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+import kernels
+
+INDEX_FILE = "index.csv"
+_OFFSET_COLS = ["row_id", "run", "trial", "chunk", "eq_offset", "eq_len", "n_bars", "stride",
+                "tr_offset", "tr_len"]
+
+
+class ResultsStore:
+    """Store append-only de resultados por trial. Seguro para `n_jobs > 1` (threads)."""
+
+    def __init__(self, path="results", chunk_size=256):
+        self.path = path
+        self.chunk_size = int(chunk_size)
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._index = None
+        self._mmaps = {}
+
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            self._columns = list(pd.read_csv(index_path, nrows=0).columns)
+            ids = pd.read_csv(index_path, usecols=["row_id", "run", "chunk"])
+            self._next_chunk = int(ids["chunk"].max()) + 1 if len(ids) else 0
+            self._next_row = int(ids["row_id"].max()) + 1 if len(ids) else 0
+            self.run = int(ids["run"].max()) + 1 if len(ids) else 0
+        else:
+            self._columns = None
+            self._next_chunk = 0
+            self._next_row = 0
+            self.run = 0
+
+    # -------------------------
+    # Escritura
+    # -------------------------
+    def append(self, trial, params, metrics, equity, trade_pnl, stride=1, n_bars=None):
+        """
+        Agrega un trial al buffer; se escribe a disco al completar un chunk.
+
+        Parameters
+        ----------
+        trial : int
+            Número de trial (p.ej. `trial.number`).
+        params, metrics : dict
+            Hiperparámetros y métricas del backtest.
+        equity : array-like
+            Columna 'portfolio_value' del backtest (se guarda como float32).
+        trade_pnl : array-like
+            Columna 'trade_pnl' (sólo se guardan las barras con trade cerrado)
+            o el array de trades de `BacktestResult` (TRADE_DTYPE).
+        stride, n_bars : int
+            `BacktestResult.stride` y `.n_bars` si la equity es compacta
+            (con stride=1, n_bars es el largo de `equity`).
+
+        Returns
+        -------
+        int
+            `row_id` asignado al trial (único en el store).
+        """
+        equity = np.asarray(equity, dtype=np.float32)
+        if n_bars is None:
+            if stride != 1:
+                raise ValueError("Con stride > 1 hay que pasar n_bars.")
+            n_bars = len(equity)
+        if getattr(trade_pnl, "dtype", None) is not None and trade_pnl.dtype.names:
+            bars = trade_pnl["bar"].astype(np.int32)
+            pnl = trade_pnl["pnl"].astype(np.float64)
+        else:
+            trade_pnl = np.asarray(trade_pnl, dtype=np.float64)
+            bars = np.flatnonzero(trade_pnl).astype(np.int32)
+            pnl = trade_pnl[bars]
+
+        row = {"trial": int(trial), "run": self.run, "n_bars": int(n_bars), "stride": int(stride)}
+        row.update({k: v for k, v in params.items()})
+        row.update({k: (float(v) if v is not None else np.nan) for k, v in metrics.items()})
+
+        with self._lock:
+            row["row_id"] = row_id = self._next_row
+            self._next_row += 1
+            self._buffer.append((row, equity, pnl, bars))
+            if len(self._buffer) >= self.chunk_size:
+                self._flush_locked()
+        return row_id
+
+    def flush(self):
+        """Escribe a disco los trials pendientes."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        chunk = self._next_chunk
+        rows = []
+        eq_off = tr_off = 0
+        for row, equity, pnl, bars in self._buffer:
+            row = dict(row, chunk=chunk,
+                       eq_offset=eq_off, eq_len=len(equity),
+                       tr_offset=tr_off, tr_len=len(pnl))
+            eq_off += len(equity)
+            tr_off += len(pnl)
+            rows.append(row)
+
+        np.save(self._chunk_path(chunk, "equity"), np.concatenate([b[1] for b in self._buffer]))
+        np.save(self._chunk_path(chunk, "trades"), np.concatenate([b[2] for b in self._buffer]))
+        np.save(self._chunk_path(chunk, "bars"), np.concatenate([b[3] for b in self._buffer]))
+
+        # El índice se escribe después de los datos: nunca apunta a un chunk incompleto
+        df_rows = pd.DataFrame(rows)
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if self._columns is None:
+            rest = [c for c in df_rows.columns if c not in _OFFSET_COLS]
+            self._columns = _OFFSET_COLS + rest
+            df_rows.reindex(columns=self._columns).to_csv(index_path, index=False)
+        else:
+            df_rows.reindex(columns=self._columns).to_csv(index_path, mode="a", header=False, index=False)
+
+        self._buffer = []
+        self._next_chunk += 1
+        self._index = None
+
+    def _chunk_path(self, chunk, kind):
+        return os.path.join(self.path, f"chunk_{chunk:05d}_{kind}.npy")
+
+    # -------------------------
+    # Lectura / consultas
+    # -------------------------
+    @property
+    def index(self) -> pd.DataFrame:
+        """Índice completo (params + métricas + offsets), una fila por trial."""
+        if self._index is None:
+            index_path = os.path.join(self.path, INDEX_FILE)
+            if os.path.exists(index_path):
+                self._index = pd.read_csv(index_path)
+            else:
+                self._index = pd.DataFrame(columns=_OFFSET_COLS)
+        return self._index
+
+    def query(self, expr=None, sort_by="calmar_ratio", ascending=False, top=None) -> pd.DataFrame:
+        """
+        Filtra el índice con una expresión de `DataFrame.query` y ordena por una métrica.
+
+        Ej.: `store.query("max_drawdown > -0.20", sort_by="calmar_ratio", top=50)`
+        """
+        idx = self.index
+        if expr:
+            idx = idx.query(expr)
+        if sort_by is not None:
+            idx = idx.sort_values(sort_by, ascending=ascending)
+        if top is not None:
+            idx = idx.head(top)
+        return idx
+
+    def _mmap(self, chunk, kind):
+        key = (int(chunk), kind)
+        if key not in self._mmaps:
+            self._mmaps[key] = np.load(self._chunk_path(chunk, kind), mmap_mode="r")
+        return self._mmaps[key]
+
+    def _rows(self, rows):
+        if isinstance(rows, pd.DataFrame):
+            return rows
+        row_ids = np.atleast_1d(rows)
+        idx = self.index
+        return idx[idx["row_id"].isin(row_ids)]
+
+    def load_equity(self, rows) -> dict:
+        """
+        Curvas de equity (float32, memory-mapped) de los trials indicados,
+        por `row_id`.
+
+        `rows` puede ser el resultado de `query` o una lista de `row_id`.
+        """
+        out = {}
+        for r in self._rows(rows).itertuples(index=False):
+            mm = self._mmap(r.chunk, "equity")
+            out[int(r.row_id)] = mm[int(r.eq_offset):int(r.eq_offset) + int(r.eq_len)]
+        return out
+
+    def load_equity_frames(self, rows) -> dict:
+        """
+        Curvas de equity como DataFrames con 'portfolio_value' indexado por
+        barra (igual que `BacktestResult.to_frame`), por `row_id`.
+        """
+        out = {}
+        for r in self._rows(rows).itertuples(index=False):
+            mm = self._mmap(r.chunk, "equity")
+            curve = mm[int(r.eq_offset):int(r.eq_offset) + int(r.eq_len)].astype(np.float64)
+            bars = kernels.checkpoint_bars(int(r.n_bars), int(r.stride))
+            out[int(r.row_id)] = pd.DataFrame({"portfolio_value": curve}, index=bars)
+        return out
+
+    def load_trades(self, rows) -> dict:
+        """PnL de trades cerrados por trial: {row_id: DataFrame(bar, pnl)}."""
+        out = {}
+        for r in self._rows(rows).itertuples(index=False):
+            sl = slice(int(r.tr_offset), int(r.tr_offset) + int(r.tr_len))
+            out[int(r.row_id)] = pd.DataFrame({
+                "bar": self._mmap(r.chunk, "bars")[sl],
+                "pnl": self._mmap(r.chunk, "trades")[sl],
+            })
+        return out
@@ -0,0 +1,272 @@
+"""
+Sensitivity analysis on stored trial results
+
+Trabaja sobre trials ya evaluados (ResultsStore, DataFrame o un estudio de
+Optuna), sin volver a correr backtests:
+
+- Ajusta un surrogate cuadrático (ridge sobre parámetros estandarizados,
+  con interacciones) que predice la métrica a partir de los parámetros.
+- Dependencia parcial 1-D y 2-D: se evalúa el surrogate en lote sobre
+  (grid x trials) con operaciones vectorizadas.
+- Importancia estilo fANOVA: varianza de cada efecto principal (y de las
+  interacciones de a pares) relativa a la varianza total del surrogate.
+
+`one_at_a_time` sí corre backtests alrededor del óptimo, pero reusa los
+indicadores con `signals.IndicatorCache` y el kernel de `kernels.py`.
+"""
+
+import numpy as np
+import pandas as pd
+
+import kernels
+from signals import IndicatorCache, SIGNAL_PARAMS
+from backtesting import trades_from_fills
+from pfmn_metrics import calculate_all_metrics
+from optimization import PARAM_SPACE, INVALID_SCORE
+from results_store import ResultsStore
+
+
+def load_trials(source, metric="calmar_ratio", params=None):
+    """
+    Extrae (X, y, nombres) de trials guardados.
+
+    `source` puede ser un `ResultsStore`, un DataFrame con una columna por
+    parámetro y por métrica, o un `optuna.Study` (usa el valor objetivo).
+    Se descartan trials con métrica NaN/inf y los inválidos para `objective`
+    (columna 'valid' falsa, o valor INVALID_SCORE en el estudio).
+    """
+    if hasattr(source, "trials_dataframe"):
+        df = source.trials_dataframe()
+        df = df[(df["state"] == "COMPLETE") & (df["value"] > INVALID_SCORE)]
+        df = df.rename(columns=lambda c: c[len("params_"):] if c.startswith("params_") else c)
+        df = df.rename(columns={"value": metric})
+    elif isinstance(source, ResultsStore):
+        df = source.index
+    else:
+        df = source
+    if "valid" in df.columns:
+        df = df[df["valid"].astype(bool)]
+
+    names = list(params or [p for p in PARAM_SPACE if p in df.columns])
+    data = df[names + [metric]].apply(pd.to_numeric, errors="coerce")
+    data = data.replace([np.inf, -np.inf], np.nan).dropna()
+    return data[names].to_numpy(dtype=float), data[metric].to_numpy(dtype=float), names
+
+
+class QuadraticSurrogate:
+    """
+    Regresión ridge con términos lineales, cuadráticos e interacciones.
+
+    Con `interactions=None` las interacciones de a pares se incluyen sólo si
+    hay al menos dos trials por coeficiente; si no, el modelo es aditivo.
+    """
+
+    def __init__(self, ridge=1e-3, interactions=None):
+        self.ridge = ridge
+        self.interactions = interactions
+
+    def _features(self, X):
+        Z = (X - self.mean_) / self.scale_
+        if self.interactions_:
+            iu, ju = np.triu_indices(Z.shape[-1])
+        else:
+            iu = ju = np.arange(Z.shape[-1])
+        quad = Z[..., iu] * Z[..., ju]
+        ones = np.ones(Z.shape[:-1] + (1,))
+        return np.concatenate([ones, Z, quad], axis=-1)
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        self.mean_ = X.mean(axis=0)
+        self.scale_ = X.std(axis=0)
+        self.scale_[self.scale_ == 0] = 1.0
+        p = X.shape[1]
+        n_full = 1 + p + p * (p + 1) // 2
+        self.interactions_ = (len(X) >= 2 * n_full) if self.interactions is None else self.interactions
+        F = self._features(X)
+        A = F.T @ F + self.ridge * len(X) * np.eye(F.shape[1])
+        A[0, 0] -= self.ridge * len(X)  # no penalizar el intercepto
+        self.coef_ = np.linalg.solve(A, F.T @ y)
+        pred = F @ self.coef_
+        ss_tot = ((y - y.mean()) ** 2).sum()
+        self.r2_ = 1.0 - ((y - pred) ** 2).sum() / ss_tot if ss_tot > 0 else np.nan
+        return self
+
+    def predict(self, X):
+        """Predice para arrays de forma (..., n_params)."""
+        return self._features(np.asarray(X, dtype=float)) @ self.coef_
+
+
+def _grid(x, n_grid):
+    return np.unique(np.quantile(x, np.linspace(0, 1, n_grid)))
+
+
+def _subsample(X, max_rows, seed=0):
+    if len(X) <= max_rows:
+        return X
+    idx = np.random.default_rng(seed).choice(len(X), max_rows, replace=False)
+    return X[idx]
+
+
+def _product_sample(X, n, seed=0):
+    """Muestra con cada columna remuestreada de forma independiente (producto de marginales)."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.choice(X[:, j], n) for j in range(X.shape[1])])
+
+
+def partial_dependence(model, X, j, n_grid=20, max_rows=500):
+    """PD 1-D del parámetro j: (grid, pd) con pd[g] = mean_n f(x_j = grid[g], x_-j = X[n])."""
+    grid = _grid(X[:, j], n_grid)
+    batch = np.repeat(_subsample(X, max_rows)[None], len(grid), axis=0)
+    batch[:, :, j] = grid[:, None]
+    return grid, model.predict(batch).mean(axis=1)
+
+
+def partial_dependence_2d(model, X, i, j, n_grid=15, max_rows=300):
+    """PD 2-D de (i, j): (grid_i, grid_j, superficie[len(grid_i), len(grid_j)])."""
+    gi, gj = _grid(X[:, i], n_grid), _grid(X[:, j], n_grid)
+    Xs = _subsample(X, max_rows)
+    batch = np.broadcast_to(Xs, (len(gi), len(gj)) + Xs.shape).copy()
+    batch[..., i] = gi[:, None, None]
+    batch[..., j] = gj[None, :, None]
+    return gi, gj, model.predict(batch).mean(axis=2)
+
+
+def _marginal_draws(x, n):
+    """
+    Muestra estratificada de `n` valores de la marginal empírica de x
+    (cuantiles en (k + 0.5) / n), agrupada: (valores, pesos). Un parámetro
+    entero queda con sus valores distintos, pesados por su frecuencia.
+    """
+    q = np.quantile(x, (np.arange(n) + 0.5) / n, method="inverted_cdf")
+    values, counts = np.unique(q, return_counts=True)
+    return values, counts / n
+
+
+def _weighted_var(v, w):
+    return float(w @ (v - w @ v) ** 2)
+
+
+def importance(model, X, names, n_grid=20, n_draws=200, max_rows=500, top_pairs=5, seed=0):
+    """
+    Importancia estilo fANOVA a partir del surrogate, toda bajo el producto
+    de las marginales de los parámetros: la varianza total, los efectos
+    principales y las interacciones se miden sobre muestras en las que cada
+    parámetro se remuestrea de forma independiente.
+
+    El efecto principal de j es la PD sobre un fondo de `max_rows` filas de
+    esa muestra, evaluada en `n_draws` valores de la marginal de j
+    (`_marginal_draws`). Las interacciones usan `n_grid` valores por parámetro.
+
+    Returns
+    -------
+    (main, pairs) : DataFrames
+        main: varianza del efecto principal de cada parámetro, como fracción
+        de la varianza total ('importance') y normalizada a 1 ('normalized').
+        pairs: varianza de la interacción para los `top_pairs` pares de los
+        parámetros más importantes, como fracción de la varianza total.
+    """
+    total_var = model.predict(_product_sample(X, 20 * max_rows, seed=seed)).var()
+    background = _product_sample(X, max_rows, seed=seed + 1)
+
+    main_var = np.empty(len(names))
+    for j in range(len(names)):
+        values, w = _marginal_draws(X[:, j], n_draws)
+        batch = np.repeat(background[None], len(values), axis=0)
+        batch[:, :, j] = values[:, None]
+        main_var[j] = _weighted_var(model.predict(batch).mean(axis=1), w)
+
+    main = pd.DataFrame({
+        "param": names,
+        "importance": main_var / total_var if total_var > 0 else np.nan,
+        "normalized": main_var / main_var.sum() if main_var.sum() > 0 else np.nan,
+    }).sort_values("importance", ascending=False).reset_index(drop=True)
+
+    order = [names.index(p) for p in main["param"]]
+    k = min(len(order), max(2, int(np.ceil((1 + np.sqrt(1 + 8 * top_pairs)) / 2))))
+    bg = background[: max_rows // 2]
+    rows = []
+    for a in range(k):
+        for b in range(a + 1, k):
+            i, j = order[a], order[b]
+            (vi, wi), (vj, wj) = _marginal_draws(X[:, i], n_grid), _marginal_draws(X[:, j], n_grid)
+            batch = np.broadcast_to(bg, (len(vi), len(vj)) + bg.shape).copy()
+            batch[..., i] = vi[:, None, None]
+            batch[..., j] = vj[None, :, None]
+            surf = model.predict(batch).mean(axis=2)
+            # ANOVA de dos vías con los pesos de las marginales
+            inter = surf - (surf @ wj)[:, None] - (wi @ surf)[None, :] + wi @ surf @ wj
+            var = wi @ inter ** 2 @ wj
+            rows.append((names[i], names[j], var / total_var if total_var > 0 else np.nan))
+    pairs = (pd.DataFrame(rows, columns=["param_a", "param_b", "interaction"])
+             .sort_values("interaction", ascending=False).head(top_pairs).reset_index(drop=True))
+    return main, pairs
+
+
+def one_at_a_time(df, best_params, metric="calmar_ratio", rel_steps=(-0.2, -0.1, -0.05, 0.0, 0.05, 0.1, 0.2),
+                  cache=None, com=0.125/100, borrow_rate=0.25/100, initial_cash=1_000_000,
+                  bars_per_year=24*365):
+    """
+    Perturba cada parámetro alrededor de `best_params` (pasos relativos al
+    ancho de su rango en PARAM_SPACE) y corre el backtest.
+
+    Los indicadores salen de `cache` (IndicatorCache sobre df['close']), así
+    que sólo se calcula cada periodo distinto una vez.
+    """
+    cache = cache if cache is not None else IndicatorCache(df["close"])
+    base = {k: float(best_params[k]) for k in PARAM_SPACE}
+
+    rows = []
+    for name, (low, high, kind) in PARAM_SPACE.items():
+        values = base[name] + np.asarray(rel_steps) * (high - low)
+        values = np.clip(values, low, high)
+        if kind is int:
+            values = np.round(values)
+        for v in np.unique(values):
+            p = dict(base, **{name: v})
+            signal = cache.signal(**{k: p[k] for k in SIGNAL_PARAMS})
+            equity, _pnl, _cash, fills = kernels.backtest_loop(
+                cache.close, signal, p["stop_loss_pct"], p["take_profit_pct"],
+                com, borrow_rate, initial_cash, dense_pnl=False)
+            trades = trades_from_fills(fills)
+            m = calculate_all_metrics(pd.DataFrame({"portfolio_value": equity}),
+                                      risk_free_rate=0.0, bars_per_year=bars_per_year,
+                                      trade_pnl=trades["pnl"][~trades["forced"]])
+            rows.append((name, v, v - base[name], m[metric]))
+    return pd.DataFrame(rows, columns=["param", "value", "delta", metric])
+
+
+def sensitivity_report(source, metric="calmar_ratio", df=None, best_params=None, n_grid=20):
+    """
+    Reporte completo: surrogate, importancias, PD 1-D de todos los
+    parámetros, PD 2-D del par con más interacción y, si se pasan `df` y
+    `best_params`, el barrido one-at-a-time.
+    """
+    X, y, names = load_trials(source, metric)
+    if len(X) < len(names) + 2:
+        raise ValueError(f"Muy pocos trials válidos ({len(X)}) para el análisis.")
+
+    model = QuadraticSurrogate().fit(X, y)
+    main, pairs = importance(model, X, names, n_grid=n_grid)
+    pd_1d = {names[j]: partial_dependence(model, X, j, n_grid) for j in range(len(names))}
+
+    pd_2d = None
+    if len(pairs):
+        a, b = pairs.iloc[0]["param_a"], pairs.iloc[0]["param_b"]
+        pd_2d = (a, b) + partial_dependence_2d(model, X, names.index(a), names.index(b))
+
+    oat = None
+    if df is not None and best_params is not None:
+        oat = one_at_a_time(df, best_params, metric=metric)
+
+    return {
+        "metric": metric,
+        "n_trials": len(X),
+        "r2": model.r2_,
+        "importance": main,
+        "interactions": pairs,
+        "pd_1d": pd_1d,
+        "pd_2d": pd_2d,
+        "oat": oat,
+        "model": model,
+    }
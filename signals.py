@@ -1,12 +1,16 @@
 import pandas as pd
 import numpy as np
-import ta
+import kernels
+
+# Parámetros de make_signals (el resto del espacio de búsqueda es del backtest)
+SIGNAL_PARAMS = ("rsi_period", "rsi_overbought", "rsi_oversold",
+                 "ema_short", "ema_long", "bb_window", "bb_std")
 
 
 def make_signals(df, 
                     rsi_period=14, rsi_overbought=70, rsi_oversold=30,
                     ema_short=8, ema_long=21,
-                    bb_window=20, bb_std=2):
+                    bb_window=20, bb_std=2, engine="kernels"):
     """
         Construye señales de compra, venta o espera utilizando tres indicadores técnicos:
         RSI, medias móviles exponenciales (EMA) y Bandas de Bollinger. 
@@ -32,6 +36,9 @@ def make_signals(df,
             Periodo de la media móvil exponencial corta (EMA rápida).
         ema_long : int, predeterminado=21
             Periodo de la media móvil exponencial larga (EMA lenta).
+        engine : {"kernels", "ta"}, predeterminado="kernels"
+            Implementación de los indicadores. "kernels" usa `kernels.py` (numba si
+            está instalado, NumPy puro si no); "ta" usa la librería `ta` original.
 
         Descripción de la lógica
         ------------------------
@@ -60,19 +67,39 @@ def make_signals(df,
             -1 → señal de venta / posición corta
         """
     df = df.copy()
-    
-    # RSI
-    df["rsi"] = ta.momentum.RSIIndicator(close=df["close"], window=rsi_period).rsi()
-
-    # EMA
-    df["ema_short"] = ta.trend.EMAIndicator(close=df["close"], window=ema_short).ema_indicator()
-    df["ema_long"]  = ta.trend.EMAIndicator(close=df["close"], window=ema_long).ema_indicator()
-
-    # Bollinger Bands
-    bb = ta.volatility.BollingerBands(close=df["close"], window=bb_window, window_dev=bb_std)
-    df["bb_mid"] = bb.bollinger_mavg()
-    df["bb_upper"] = bb.bollinger_hband()
-    df["bb_lower"] = bb.bollinger_lband()
+
+    if engine == "ta":
+        import ta
+
+        # RSI
+        df["rsi"] = ta.momentum.RSIIndicator(close=df["close"], window=rsi_period).rsi()
+
+        # EMA
+        df["ema_short"] = ta.trend.EMAIndicator(close=df["close"], window=ema_short).ema_indicator()
+        df["ema_long"]  = ta.trend.EMAIndicator(close=df["close"], window=ema_long).ema_indicator()
+
+        # Bollinger Bands
+        bb = ta.volatility.BollingerBands(close=df["close"], window=bb_window, window_dev=bb_std)
+        df["bb_mid"] = bb.bollinger_mavg()
+        df["bb_upper"] = bb.bollinger_hband()
+        df["bb_lower"] = bb.bollinger_lband()
+    elif engine == "kernels":
+        close = df["close"].to_numpy(dtype=float)
+
+        # RSI
+        df["rsi"] = kernels.rsi_wilder(close, rsi_period)
+
+        # EMA
+        df["ema_short"] = kernels.ema(close, ema_short)
+        df["ema_long"]  = kernels.ema(close, ema_long)
+
+        # Bollinger Bands
+        bb_mid, bb_sd = kernels.rolling_mean_std(close, bb_window)
+        df["bb_mid"] = bb_mid
+        df["bb_upper"] = bb_mid + bb_std * bb_sd
+        df["bb_lower"] = bb_mid - bb_std * bb_sd
+    else:
+        raise ValueError(f"engine desconocido: {engine!r} (usa 'kernels' o 'ta').")
     
     # Individual Signals
     # RSI: oversold -> +1, overbought -> -1, otherwise 0
@@ -101,3 +128,136 @@ def make_signals(df,
     df.loc[signal_sum <= -2, 'signal'] = -1
     
     return df
+
+
+class SignalState:
+    """
+    Versión incremental de `make_signals`: recibe un cierre por barra y devuelve
+    la señal (1, 0, -1) con las mismas reglas e indicadores (RSI de Wilder, EMAs,
+    Bandas de Bollinger con desviación ddof=0). Útil para trading en vivo, donde
+    no se tiene el histórico completo.
+    """
+
+    def __init__(self, rsi_period=14, rsi_overbought=70, rsi_oversold=30,
+                 ema_short=8, ema_long=21, bb_window=20, bb_std=2):
+        self.rsi_period = int(rsi_period)
+        self.rsi_overbought = rsi_overbought
+        self.rsi_oversold = rsi_oversold
+        self.ema_short = int(ema_short)
+        self.ema_long = int(ema_long)
+        self.bb_window = int(bb_window)
+        self.bb_std = bb_std
+
+        self._n = 0
+        self._prev_close = None
+        self._avg_up = 0.0
+        self._avg_down = 0.0
+        self._ema_s = 0.0
+        self._ema_l = 0.0
+        self._window = np.empty(self.bb_window, dtype=float)
+
+    def update(self, close: float) -> int:
+        close = float(close)
+        if self._n == 0:
+            diff = 0.0
+            self._ema_s = self._ema_l = close
+        else:
+            diff = close - self._prev_close
+            a_s = 2.0 / (self.ema_short + 1.0)
+            a_l = 2.0 / (self.ema_long + 1.0)
+            self._ema_s = a_s * close + (1 - a_s) * self._ema_s
+            self._ema_l = a_l * close + (1 - a_l) * self._ema_l
+
+        # RSI (Wilder): la primera barra entra con diff = 0, igual que en `ta`
+        a = 1.0 / self.rsi_period
+        up, down = max(diff, 0.0), max(-diff, 0.0)
+        if self._n == 0:
+            self._avg_up, self._avg_down = up, down
+        else:
+            self._avg_up = a * up + (1 - a) * self._avg_up
+            self._avg_down = a * down + (1 - a) * self._avg_down
+
+        self._window[self._n % self.bb_window] = close
+        self._prev_close = close
+        self._n += 1
+
+        # Votos; un indicador sin ventana completa (NaN en make_signals) vota 0
+        rsi_signal = 0
+        if self._n >= self.rsi_period:
+            if self._avg_down == 0:
+                rsi = 100.0
+            else:
+                rsi = 100.0 - 100.0 / (1.0 + self._avg_up / self._avg_down)
+            if rsi < self.rsi_oversold:
+                rsi_signal = 1
+            elif rsi > self.rsi_overbought:
+                rsi_signal = -1
+
+        ema_signal = 0
+        if self._n >= self.ema_short and self._n >= self.ema_long:
+            if self._ema_s > self._ema_l:
+                ema_signal = 1
+            elif self._ema_s < self._ema_l:
+                ema_signal = -1
+
+        bb_signal = 0
+        if self._n >= self.bb_window:
+            mid = self._window.mean()
+            sd = self._window.std()
+            if close < mid - self.bb_std * sd:
+                bb_signal = 1
+            elif close > mid + self.bb_std * sd:
+                bb_signal = -1
+
+        signal_sum = rsi_signal + ema_signal + bb_signal
+        if signal_sum >= 2:
+            return 1
+        if signal_sum <= -2:
+            return -1
+        return 0
+
+
+class IndicatorCache:
+    """
+    Cache de indicadores para una serie de cierres fija. Cada RSI/EMA/Bollinger
+    se calcula una sola vez por parámetro, así que evaluar muchas combinaciones
+    que comparten periodos (p.ej. barridos de sensibilidad) no recalcula nada.
+    """
+
+    def __init__(self, close):
+        self.close = np.ascontiguousarray(np.asarray(close, dtype=float))
+        self._rsi = {}
+        self._ema = {}
+        self._bb = {}
+
+    def rsi(self, period):
+        period = int(period)
+        if period not in self._rsi:
+            self._rsi[period] = kernels.rsi_wilder(self.close, period)
+        return self._rsi[period]
+
+    def ema(self, window):
+        window = int(window)
+        if window not in self._ema:
+            self._ema[window] = kernels.ema(self.close, window)
+        return self._ema[window]
+
+    def bb(self, window):
+        """(media, desviación ddof=0) móviles de la ventana."""
+        window = int(window)
+        if window not in self._bb:
+            self._bb[window] = kernels.rolling_mean_std(self.close, window)
+        return self._bb[window]
+
+    def signal(self, rsi_period=14, rsi_overbought=70, rsi_oversold=30,
+               ema_short=8, ema_long=21, bb_window=20, bb_std=2) -> np.ndarray:
+        """Columna 'signal' de `make_signals` como array int64, usando la cache."""
+        rsi = self.rsi(rsi_period)
+        ema_s, ema_l = self.ema(ema_short), self.ema(ema_long)
+        bb_mid, bb_sd = self.bb(bb_window)
+
+        # Comparaciones con NaN dan False -> voto 0, igual que en make_signals
+        votes = ((rsi < rsi_oversold).astype(np.int64) - (rsi > rsi_overbought)
+                 + (ema_s > ema_l) - (ema_s < ema_l)
+                 + (self.close < bb_mid - bb_std * bb_sd) - (self.close > bb_mid + bb_std * bb_sd))
+        return np.where(votes >= 2, 1, np.where(votes <= -2, -1, 0)).astype(np.int64)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Los módulos del proyecto viven en la raíz del repo (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def make_prices():
+    """
+    Fábrica de velas sintéticas (random walk log-normal) con las columnas que
+    deja `main.load_data`: 'date', 'close' y 'volume btc'.
+    """
+    def _make(n, seed=0):
+        rng = np.random.default_rng(seed)
+        close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        return pd.DataFrame({
+            "date": pd.date_range("2020-01-01", periods=n, freq="h").astype(str),
+            "close": close,
+            "volume btc": rng.uniform(10, 100, n),
+        })
+    return _make
@@ -0,0 +1,40 @@
+import pytest
+
+from backtesting import PositionBook, run_backtest
+from pfmn_metrics import calculate_all_metrics
+from signals import make_signals
+
+KWARGS = dict(stop_loss=0.03, take_profit=0.12, com=0.125 / 100, borrow_rate=0.25 / 100,
+              initial_cash=1_000_000)
+
+
+@pytest.fixture(scope="module")
+def df_sig(make_prices):
+    return make_signals(make_prices(20_000, seed=5))
+
+
+def test_closed_trades_counts_every_sl_tp_close(df_sig):
+    result, _cash = run_backtest(df_sig, output="compact", **KWARGS)
+    df_bt, _cash = run_backtest(df_sig, **KWARGS)
+
+    book = PositionBook(**KWARGS)
+    closes = sum(o.reason.startswith("close")
+                 for price, signal in zip(df_sig["close"], df_sig["signal"])
+                 for o in book.step(price, signal))
+
+    assert result.n_trades == len(result.closed_trades) == closes
+    # Antes se contaban barras: varias posiciones pueden cerrar en la misma barra
+    assert closes > (df_bt["trade_pnl"] != 0).sum()
+    assert result.closed_trades["pnl"].sum() == pytest.approx(df_bt["trade_pnl"].sum(), rel=1e-12)
+
+
+def test_strided_metrics_match_dense(df_sig):
+    dense, _cash = run_backtest(df_sig, output="compact", **KWARGS)
+    sparse, _cash = run_backtest(df_sig, output="compact", stride=24, **KWARGS)
+
+    m1 = calculate_all_metrics(dense.to_frame(), stride=dense.stride)
+    m24 = calculate_all_metrics(sparse.to_frame(), stride=sparse.stride)
+
+    assert m24["total_return"] == pytest.approx(m1["total_return"])
+    assert m24["calmar_ratio"] == pytest.approx(m1["calmar_ratio"], rel=0.1)
+    assert m24["sharpe_ratio"] == pytest.approx(m1["sharpe_ratio"], rel=0.2)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import kernels
+from backtesting import run_backtest
+from costs import CostModel
+from signals import make_signals
+
+KWARGS = dict(stop_loss=0.03, take_profit=0.12, initial_cash=1_000_000)
+MODEL = CostModel(commission=0.001, spread_bps=2.0, impact_coef=0.1,
+                  borrow_rate=0.30, funding_rate=0.10)
+
+
+def _fill(entry_bar, exit_bar, side, n_shares=2.0, entry_price=100.0, exit_price=110.0):
+    row = dict(entry_bar=entry_bar, exit_bar=exit_bar, side=side, n_shares=n_shares,
+               entry_price=entry_price, exit_price=exit_price, forced=0.0, pnl=0.0)
+    return [row[c] for c in kernels.FILL_COLUMNS]
+
+
+@pytest.fixture(scope="module")
+def df_sig(make_prices):
+    return make_signals(make_prices(5000, seed=1))
+
+
+def test_final_equity_equals_net_cash(df_sig):
+    df_bt, cash = run_backtest(df_sig, cost_model=MODEL, **KWARGS)
+    gross, gross_cash = run_backtest(df_sig, com=0.0, borrow_rate=0.0, **KWARGS)
+
+    assert df_bt["portfolio_value"].iloc[-1] == pytest.approx(cash, rel=1e-12)
+    assert cash < gross_cash
+    assert (df_bt["portfolio_value"] <= gross["portfolio_value"] + 1e-6).all()
+
+
+@pytest.mark.parametrize("stride", [7, 24])
+def test_compact_matches_frame_at_checkpoints(df_sig, stride):
+    df_bt, cash = run_backtest(df_sig, cost_model=MODEL, **KWARGS)
+    result, compact_cash = run_backtest(df_sig, cost_model=MODEL, output="compact",
+                                        stride=stride, **KWARGS)
+
+    assert compact_cash == pytest.approx(cash, rel=1e-12)
+    np.testing.assert_allclose(result.equity, df_bt["portfolio_value"].to_numpy()[result.bars],
+                               rtol=1e-12)
+    assert result.closed_trades["pnl"].sum() == pytest.approx(df_bt["trade_pnl"].sum(), rel=1e-9)
+
+
+def test_carry_is_linear_in_holding_time_and_short_only_without_funding():
+    model = CostModel(commission=0.0, borrow_rate=0.25, funding_rate=0.0, bars_per_year=100)
+    fills = np.array([_fill(0, 10, -1), _fill(0, 20, -1), _fill(5, 45, -1), _fill(0, 40, 1)])
+    carry = model.fill_costs(fills)["carry"]
+
+    notional = 2.0 * 100.0
+    np.testing.assert_allclose(carry[:3], notional * 0.25 * np.array([10, 20, 40]) / 100)
+    assert carry[3] == 0.0
+
+
+def test_carry_accrues_while_the_position_is_open():
+    model = CostModel(commission=0.001, borrow_rate=0.25, bars_per_year=100)
+    fills = np.array([_fill(2, 6, -1)])
+    c = model.fill_costs(fills)
+    pv, _pnl, cash, _fills = model.apply(np.zeros(10), np.zeros(10), 0.0, fills)
+
+    bars = np.arange(10)
+    expected = -(c["entry"] * (bars >= 2) + c["exit"] * (bars >= 6)
+                 + c["carry_per_bar"] * np.clip(bars - 2, 0, 4))
+    np.testing.assert_allclose(pv, expected)
+    assert pv[-1] == pytest.approx(cash)
+
+
+def test_impact_without_volume_raises(df_sig):
+    with pytest.raises(ValueError, match="volumen"):
+        MODEL.fill_costs(np.array([_fill(0, 3, 1)]))
+    with pytest.raises(ValueError, match="volume"):
+        run_backtest(df_sig.drop(columns="volume btc"), cost_model=MODEL, **KWARGS)
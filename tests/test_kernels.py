@@ -0,0 +1,128 @@
+"""
+Paridad de `kernels.py` (numba y NumPy) contra `ta` y el loop original de `run_backtest`.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import kernels
+from signals import make_signals
+
+ta = pytest.importorskip("ta")
+
+
+@pytest.fixture(params=[True, False], ids=["numba", "numpy"])
+def use_numba(request, monkeypatch):
+    if request.param and not kernels.HAS_NUMBA:
+        pytest.skip("numba no está instalado")
+    monkeypatch.setattr(kernels, "USE_NUMBA", request.param)
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def close(make_prices):
+    return make_prices(3000, seed=7)["close"]
+
+
+def _reference_backtest(prices, signals, stop_loss, take_profit, com, borrow_rate, initial_cash):
+    """Loop de `run_backtest` previo a los kernels, sobre listas de Python."""
+    cash = float(initial_cash)
+    longs, shorts = [], []   # [n_shares, entry, sl, tp]
+    portfolio_values, trade_pnls = [], []
+    fee_long, fee_short = com, com + borrow_rate
+
+    for price, signal in zip(prices, signals):
+        pnl_this_step = 0
+        closed_any = False
+        for pos in longs.copy():
+            sh, entry, sl, tp = pos
+            if price >= tp or price <= sl:
+                pnl_this_step += (price - entry) * sh - entry * sh * fee_long - price * sh * fee_long
+                cash += price * sh * (1 - fee_long)
+                longs.remove(pos)
+                closed_any = True
+        for pos in shorts.copy():
+            sh, entry, sl, tp = pos
+            if price <= tp or price >= sl:
+                pnl_gross = (entry - price) * sh
+                pnl_this_step += pnl_gross - entry * sh * fee_short - price * sh * fee_short
+                cash += pnl_gross * (1 - fee_short) + entry * sh
+                shorts.remove(pos)
+                closed_any = True
+        if signal == 1 and not shorts:
+            sh = max(1, (cash * 0.02) / price)
+            cost = price * sh * (1 + fee_long)
+            if cash > cost:
+                cash -= cost
+                longs.append([sh, price, price * (1 - stop_loss), price * (1 + take_profit)])
+        if signal == -1 and not longs:
+            sh = max(1, (cash * 0.02) / price)
+            cost = price * sh * (1 + fee_short)
+            if cash > cost:
+                cash -= cost
+                shorts.append([sh, price, price * (1 + stop_loss), price * (1 - take_profit)])
+        value_longs = sum(p[0] * price for p in longs)
+        value_shorts = sum((p[1] - price) * p[0] + p[1] * p[0] for p in shorts)
+        portfolio_values.append(cash + value_longs + value_shorts)
+        trade_pnls.append(pnl_this_step if closed_any else 0)
+
+    last_price = prices[-1]
+    cash += last_price * sum(p[0] for p in longs) * (1 - fee_long)
+    for p in shorts:
+        cash += (p[1] - last_price) * p[0] * (1 - fee_short) + p[1] * p[0]
+    portfolio_values[-1] = cash
+    return np.array(portfolio_values), np.array(trade_pnls, dtype=float), cash
+
+
+def test_rsi_matches_ta(close, use_numba):
+    expected = ta.momentum.RSIIndicator(close=close, window=14).rsi().to_numpy()
+    np.testing.assert_allclose(kernels.rsi_wilder(close, 14), expected, rtol=1e-9, atol=1e-7)
+
+
+@pytest.mark.parametrize("window", [8, 21, 80])
+def test_ema_matches_ta(close, use_numba, window):
+    expected = ta.trend.EMAIndicator(close=close, window=window).ema_indicator().to_numpy()
+    np.testing.assert_allclose(kernels.ema(close, window), expected, rtol=1e-9)
+
+
+def test_rolling_mean_std_matches_bollinger(close, use_numba):
+    bb = ta.volatility.BollingerBands(close=close, window=20, window_dev=2)
+    mean, std = kernels.rolling_mean_std(close, 20)
+    np.testing.assert_allclose(mean, bb.bollinger_mavg().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(mean + 2 * std, bb.bollinger_hband().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(mean - 2 * std, bb.bollinger_lband().to_numpy(), rtol=1e-9)
+
+
+def test_signals_match_ta_engine(close, use_numba):
+    df = pd.DataFrame({"close": close})
+    fast = make_signals(df, engine="kernels")["signal"].to_numpy()
+    slow = make_signals(df, engine="ta")["signal"].to_numpy()
+    assert (fast != slow).sum() == 0
+
+
+def test_backtest_loop_matches_original(close, use_numba):
+    prices = close.to_numpy()
+    signals = make_signals(pd.DataFrame({"close": close}))["signal"].to_numpy()
+    args = (0.03, 0.12, 0.125 / 100, 0.25 / 100, 1_000_000)
+
+    pv, pnls, cash, fills = kernels.backtest_loop(prices, signals, *args)
+    ref_pv, ref_pnls, ref_cash = _reference_backtest(prices, signals, *args)
+
+    assert len(fills) > 0
+    np.testing.assert_allclose(pv, ref_pv, rtol=1e-12)
+    np.testing.assert_allclose(pnls, ref_pnls, rtol=1e-12, atol=1e-9)
+    assert cash == pytest.approx(ref_cash, rel=1e-12)
+
+
+def test_broken_numba_falls_back_to_numpy(close, monkeypatch):
+    # numba instalado pero que no se puede importar (p.ej. NumPy incompatible)
+    monkeypatch.setitem(sys.modules, "numba", None)
+    monkeypatch.setattr(kernels, "USE_NUMBA", True)
+    monkeypatch.setattr(kernels, "_compiled", {})
+
+    signals = make_signals(pd.DataFrame({"close": close}))["signal"].to_numpy()
+    kernels.backtest_loop(close.to_numpy(), signals, 0.03, 0.12, 0.00125, 0.0025, 1_000_000)
+    assert kernels.USE_NUMBA is False
@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backtesting import PositionBook, run_backtest
+from live import LatencyHistogram, run_paper_trading
+from signals import SignalState, make_signals
+
+PARAMS = dict(rsi_period=14, rsi_overbought=70, rsi_oversold=30,
+              ema_short=8, ema_long=21, bb_window=20, bb_std=2)
+
+
+@pytest.fixture(scope="module")
+def df(make_prices):
+    return make_prices(2000, seed=11)
+
+
+def test_incremental_replay_matches_batch(df):
+    kwargs = dict(stop_loss=0.02, take_profit=0.04, com=0.125 / 100, borrow_rate=0.25 / 100,
+                  initial_cash=1_000_000)
+    df_sig = make_signals(df, **PARAMS)
+    df_bt, _cash = run_backtest(df_sig, **kwargs)
+
+    state = SignalState(**PARAMS)
+    book = PositionBook(**kwargs)
+    signals, equity, n_orders = [], [], 0
+    for price in df["close"]:
+        signal = state.update(price)
+        n_orders += len(book.step(price, signal))
+        signals.append(signal)
+        equity.append(book.equity(price))
+
+    assert n_orders > 0
+    np.testing.assert_array_equal(signals, df_sig["signal"].to_numpy())
+    # La última barra del backtest incluye el cierre forzado de posiciones
+    np.testing.assert_allclose(equity[:-1], df_bt["portfolio_value"].to_numpy()[:-1], rtol=1e-12)
+
+
+def test_percentile_never_exceeds_observed_max():
+    hist = LatencyHistogram()
+    for ns in (1_050, 1_100, 1_110):
+        hist.record(ns)
+    assert hist.percentile(50) <= hist.max_ns
+    assert hist.percentile(99.9) == hist.max_ns
+
+
+def test_replay_without_date_column_uses_index(df):
+    report = asyncio.run(run_paper_trading(df[["close"]], speed=0))
+    assert report["bars"] == len(df)
+
+
+def test_paper_trading_loop_matches_sync_replay(df):
+    async def run():
+        report = await asyncio.wait_for(
+            run_paper_trading(df, speed=0, feed_queue=1, order_queue=1), timeout=30)
+        # Cierre limpio: feed, estrategia y sink terminaron, no quedan tareas colgadas
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        return report
+
+    report = asyncio.run(run())
+
+    state, book = SignalState(), PositionBook()
+    orders = [o for price in df["close"] for o in book.step(price, state.update(price))]
+    net = sum(o.n_shares if o.side == "buy" else -o.n_shares for o in orders)
+
+    assert report["bars"] == len(df)
+    assert report["orders"] == len(orders) > 0
+    assert report["net_position"] == pytest.approx(net)
+    assert report["final_equity"] == pytest.approx(book.equity(df["close"].iloc[-1]))
+    assert report["feed_backpressure_waits"] > 0
+    assert report["latency"]["count"] == len(df)
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from bench_startup import HEAVY_MODULES
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_RUN = (
+    "import sys, main; main.main(sys.argv[1:]); "
+    "print('__loaded__', ','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def test_evaluate_does_not_import_heavy_modules(tmp_path, make_prices):
+    # Mismo formato que el CSV de Binance: más reciente primero, columnas con mayúscula
+    data = tmp_path / "btc.csv"
+    make_prices(3000).iloc[::-1].rename(columns=str.title).to_csv(data, index=False)
+    params = tmp_path / "params.csv"
+    pd.DataFrame([{"rsi_period": 14, "rsi_overbought": 70, "rsi_oversold": 30,
+                   "ema_short": 12, "ema_long": 40, "bb_window": 20, "bb_std": 2.0,
+                   "n_shares": 1.0, "stop_loss_pct": 0.03, "take_profit_pct": 0.12}]
+                 ).to_csv(params, index=False)
+
+    heavy = HEAVY_MODULES + ("numba",)
+    proc = subprocess.run(
+        [sys.executable, "-c", _RUN.format(heavy=heavy),
+         "--data", str(data), "evaluate", "--params", str(params)],
+        cwd=REPO, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert "TEST METRICS" in proc.stdout
+    loaded = proc.stdout.rsplit("__loaded__", 1)[1].strip()
+    assert loaded == ""
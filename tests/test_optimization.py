@@ -0,0 +1,36 @@
+import pytest
+
+from optimization import PARAM_SPACE, evaluate_on_df, objective
+
+
+@pytest.fixture(scope="module")
+def df(make_prices):
+    return make_prices(3000, seed=3)
+
+
+def test_objective_samples_param_space(df):
+    optuna = pytest.importorskip("optuna")
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    study = optuna.create_study(direction="maximize")
+    study.optimize(lambda t: objective(t, df), n_trials=1)
+
+    dists = study.trials[0].distributions
+    assert list(dists) == list(PARAM_SPACE)
+    for name, (low, high, kind) in PARAM_SPACE.items():
+        expected = optuna.distributions.IntDistribution if kind is int else optuna.distributions.FloatDistribution
+        assert isinstance(dists[name], expected)
+        assert (dists[name].low, dists[name].high) == (low, high)
+
+
+def test_evaluate_on_df_matches_objective(df):
+    optuna = pytest.importorskip("optuna")
+    params = {"rsi_period": 14, "rsi_overbought": 70, "rsi_oversold": 30, "ema_short": 12,
+              "ema_long": 40, "bb_window": 20, "bb_std": 2.0, "n_shares": 1.0,
+              "stop_loss_pct": 0.03, "take_profit_pct": 0.12}
+    trial = optuna.trial.FixedTrial(params)
+    calmar = objective(trial, df)
+
+    _df_bt, _cash, metrics = evaluate_on_df(df, dict(params))
+    assert calmar == pytest.approx(metrics["calmar_ratio"])
+    assert trial.user_attrs["win_rate"] == pytest.approx(metrics["win_rate"])
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from backtesting import run_backtest
+from pfmn_metrics import calculate_all_metrics
+from results_store import ResultsStore
+from signals import make_signals
+
+
+def _fill(store, n_trials, offset):
+    for t in range(n_trials):
+        equity = np.full(10, offset + t, dtype=float)
+        pnl = np.zeros(10)
+        pnl[3] = offset + t
+        store.append(t, {"bb_std": 2.0}, {"calmar_ratio": float(t)}, equity, pnl)
+    store.flush()
+
+
+def test_two_runs_in_one_directory_keep_distinct_rows(tmp_path):
+    _fill(ResultsStore(tmp_path, chunk_size=2), 5, offset=0)
+    store = ResultsStore(tmp_path, chunk_size=2)
+    _fill(store, 5, offset=100)
+
+    idx = store.index
+    assert idx["row_id"].is_unique
+    assert sorted(idx["run"].unique()) == [0, 1]
+
+    rows = idx[idx["trial"] == 3]
+    curves = store.load_equity(rows)
+    assert len(curves) == 2
+    assert sorted(float(c[0]) for c in curves.values()) == [3.0, 103.0]
+
+    trades = store.load_trades(list(rows["row_id"]))
+    assert sorted(float(t["pnl"].iloc[0]) for t in trades.values()) == [3.0, 103.0]
+
+
+def test_buffered_trials_survive_until_flush(tmp_path):
+    store = ResultsStore(tmp_path, chunk_size=100)
+    assert store.append(0, {}, {"calmar_ratio": 1.0}, np.ones(4), np.zeros(4)) == 0
+    assert len(store.index) == 0
+    store.flush()
+    assert list(ResultsStore(tmp_path).index["row_id"]) == [0]
+
+
+def test_strided_curves_keep_their_bars_and_metrics(tmp_path, make_prices):
+    df_sig = make_signals(make_prices(5000, seed=4))
+    result, _cash = run_backtest(df_sig, 0.03, 0.12, output="compact", stride=24)
+    expected = calculate_all_metrics(result.to_frame(), stride=result.stride)
+
+    store = ResultsStore(tmp_path)
+    row_id = store.append(0, {}, expected, result.equity, result.trades,
+                          stride=result.stride, n_bars=result.n_bars)
+    store.flush()
+
+    row = store.index.iloc[0]
+    frame = store.load_equity_frames([row_id])[row_id]
+    np.testing.assert_array_equal(frame.index, result.bars)
+    got = calculate_all_metrics(frame, stride=int(row["stride"]))
+    assert got["calmar_ratio"] == pytest.approx(expected["calmar_ratio"], rel=1e-5)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from optimization import INVALID_SCORE, PARAM_SPACE
+from results_store import ResultsStore
+from sensitivity import QuadraticSurrogate, importance, load_trials
+
+
+def _trials(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({k: rng.uniform(lo, hi, n) for k, (lo, hi, _kind) in PARAM_SPACE.items()})
+    df["calmar_ratio"] = -10 * (df["bb_std"] - 2.2) ** 2 + 0.01 * rng.normal(size=n)
+    return df
+
+
+def test_importance_with_a_dominant_parameter():
+    X, y, names = load_trials(_trials(5000))
+    main, _pairs = importance(QuadraticSurrogate().fit(X, y), X, names)
+
+    assert main.iloc[0]["param"] == "bb_std"
+    assert main.iloc[0]["importance"] == pytest.approx(1.0, abs=0.02)
+    assert main["importance"].iloc[1:].max() < 1e-3
+
+
+def test_importance_weights_integer_values_by_frequency():
+    # rsi_period muy concentrado en pocos valores: la grilla sin pesos exageraba el efecto
+    df = _trials(5000, seed=1)
+    rng = np.random.default_rng(2)
+    df["rsi_period"] = rng.choice([10, 11, 12, 30], size=len(df), p=[0.6, 0.2, 0.15, 0.05])
+    df["calmar_ratio"] = 0.05 * df["rsi_period"] + df["bb_std"] + 0.01 * rng.normal(size=len(df))
+    X, y, names = load_trials(df)
+    main, _pairs = importance(QuadraticSurrogate().fit(X, y), X, names)
+
+    imp = main.set_index("param")["importance"]
+    v_rsi, v_bb = (0.05 ** 2) * df["rsi_period"].var(), df["bb_std"].var()
+    assert imp["rsi_period"] == pytest.approx(v_rsi / (v_rsi + v_bb), abs=0.02)
+    assert imp["bb_std"] == pytest.approx(v_bb / (v_rsi + v_bb), abs=0.02)
+
+
+def test_main_effects_and_interaction_decompose_total_variance():
+    df = _trials(5000, seed=3)
+    z_bb = (df["bb_std"] - 2.25) / 0.43
+    z_ema = (df["ema_long"] - 55) / 14.4
+    df["calmar_ratio"] = z_bb + z_ema + z_bb * z_ema
+    X, y, names = load_trials(df)
+    main, pairs = importance(QuadraticSurrogate().fit(X, y), X, names)
+
+    top = pairs.iloc[0]
+    assert {top["param_a"], top["param_b"]} == {"bb_std", "ema_long"}
+    assert main["importance"].sum() + top["interaction"] == pytest.approx(1.0, abs=0.03)
+    assert top["interaction"] == pytest.approx(1 / 3, abs=0.03)
+
+
+def test_load_trials_drops_invalid_store_rows(tmp_path):
+    df = _trials(20)
+    store = ResultsStore(tmp_path)
+    for t, row in df.iterrows():
+        params = row[list(PARAM_SPACE)].to_dict()
+        metrics = {"calmar_ratio": row["calmar_ratio"], "valid": t % 4 != 0}
+        store.append(t, params, metrics, np.ones(4), np.zeros(4))
+    store.flush()
+
+    X, y, _names = load_trials(store)
+    assert len(X) == 15
+    np.testing.assert_allclose(y, df["calmar_ratio"][df.index % 4 != 0])
+
+
+def test_load_trials_drops_sentinel_study_trials():
+    optuna = pytest.importorskip("optuna")
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    def objective(trial):
+        x = trial.suggest_float("bb_std", 1.5, 3.0)
+        return INVALID_SCORE if trial.number % 3 == 0 else x
+
+    study = optuna.create_study(direction="maximize")
+    study.optimize(objective, n_trials=12)
+
+    _X, y, names = load_trials(study)
+    assert names == ["bb_std"]
+    assert len(y) == 8
+    assert (y > INVALID_SCORE).all()